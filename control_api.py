@@ -0,0 +1,279 @@
+# API local de controle (HTTP + WebSocket) com difusão de deltas de estado
+#
+# Toda requisição precisa do token desta execução, gravado em TOKEN_PATH:
+# "Authorization: Bearer <token>" ou ?token=<token> (WebSocket de navegador).
+# Páginas de outras origens são recusadas mesmo com o token.
+
+# Import required libraries
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import struct
+import threading
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from controller import COMMANDS
+
+HOST = "127.0.0.1"
+PORT = 8765
+TOKEN_PATH = Path.home() / ".music_player" / "control_token"
+# Origens aceitas (páginas servidas pela própria máquina)
+LOCAL_HOSTS = {"127.0.0.1", "localhost", "::1"}
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+# Cliente que não consegue acompanhar é desconectado em vez de acumular memória
+MAX_CLIENT_BUFFER = 256 * 1024
+
+
+def encode_json(data):
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+def is_local_origin(origin):
+    """True for requests without Origin (scripts) or from a page on this machine"""
+    if origin is None:
+        return True
+    try:
+        return urlsplit(origin).hostname in LOCAL_HOSTS
+    except ValueError:
+        return False
+
+
+def write_token(token, path=TOKEN_PATH):
+    """Write the token readable by the current user only"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(token)
+
+
+def ws_frame(payload, opcode=0x1):
+    """Build an unmasked server WebSocket frame"""
+    size = len(payload)
+    if size < 126:
+        header = struct.pack("!BB", 0x80 | opcode, size)
+    elif size < 65536:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, size)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, size)
+    return header + payload
+
+
+async def read_ws_frame(reader):
+    """Read one client frame, returning (opcode, payload)"""
+    first, second = await reader.readexactly(2)
+    opcode = first & 0x0F
+    size = second & 0x7F
+    if size == 126:
+        size = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif size == 127:
+        size = struct.unpack("!Q", await reader.readexactly(8))[0]
+    mask = await reader.readexactly(4) if second & 0x80 else b"\0\0\0\0"
+    payload = await reader.readexactly(size)
+    return opcode, bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+
+class ControlServer:
+    """Serves the shared controller to local scripts and UIs"""
+
+    def __init__(self, controller, host=HOST, port=PORT, token_path=TOKEN_PATH):
+        self.controller = controller
+        self.host = host
+        self.port = port
+        # Novo a cada execução: um token vazado não vale na próxima
+        self.token = secrets.token_urlsafe(32)
+        self.token_path = token_path
+        self.clients = set()
+        self.loop = None
+        self._server = None
+        self._ready = threading.Event()
+        # Erro ao abrir a porta (ex.: outra instância já nela)
+        self._error = None
+        self._thread = None
+        self._unsubscribe = None
+
+    def start(self):
+        """Run the server in a background thread with its own event loop;
+        raises OSError if the port cannot be opened"""
+        write_token(self.token, self.token_path)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            self.loop = None
+            self.stop()
+            raise self._error
+        # _on_delta só repassa para o loop: pode rodar na thread que publica
+        self._unsubscribe = self.controller.subscribe(self._on_delta, threaded=False)
+
+    def stop(self):
+        if self.loop:
+            self._unsubscribe()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+        try:
+            os.remove(self.token_path)
+        except OSError:
+            pass
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self._server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port)
+            )
+        except Exception as e:
+            # start() relança na thread que chamou
+            self._error = e
+            self.loop.close()
+            self._ready.set()
+            return
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            # Fechar clientes e encerrar as conexões pendentes antes do loop
+            self._server.close()
+            for writer in list(self.clients):
+                writer.close()
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.close()
+
+    def _on_delta(self, delta):
+        # Chamado nas threads do controller: repassa para o loop
+        self.loop.call_soon_threadsafe(self._broadcast, delta)
+
+    def _broadcast(self, delta):
+        """Encode the delta once and write the same frame to every client"""
+        frame = ws_frame(encode_json(delta))
+        for writer in list(self.clients):
+            if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+                self.clients.discard(writer)
+                writer.close()
+            else:
+                writer.write(frame)
+
+    async def _run_command(self, payload):
+        """Run a JSON command message and return (HTTP status, reply)"""
+        try:
+            message = json.loads(payload or b"{}")
+            if not isinstance(message, dict):
+                raise ValueError("A mensagem deve ser um objeto JSON")
+            name = message.get("command")
+            if name not in COMMANDS:
+                raise ValueError(f"Comando desconhecido: {name}")
+            args = message.get("args", [])
+            if not isinstance(args, list):
+                raise ValueError("args deve ser uma lista")
+            # Comandos podem decodificar arquivos: fora do loop
+            await self.loop.run_in_executor(None, getattr(self.controller, name), *args)
+        except (ValueError, TypeError) as e:
+            return 400, {"ok": False, "error": str(e)}
+        except Exception as e:
+            # Falha dentro do comando (ex.: banda de EQ inexistente): a conexão continua
+            return 500, {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        return 200, {"ok": True}
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+            if len(request_line) < 2:
+                return
+            method, target = request_line[0], urlsplit(request_line[1])
+            path = target.path
+
+            if not is_local_origin(headers.get("origin")):
+                self._respond(writer, 403, {"ok": False, "error": "origin not allowed"})
+            elif not self._authorized(headers, target.query):
+                self._respond(writer, 401, {"ok": False, "error": "missing or invalid token"})
+            elif headers.get("upgrade", "").lower() == "websocket":
+                await self._handle_websocket(reader, writer, headers)
+            elif method == "GET" and path == "/state":
+                self._respond(writer, 200, self.controller.state())
+            elif method == "GET" and path == "/queue":
+                self._respond(writer, 200, {"tracks": self.controller.queue.tracks, "order": self.controller.queue.order})
+            elif method == "POST" and path == "/command":
+                length = headers.get("content-length", "0")
+                if length.isdigit():
+                    body = await reader.readexactly(int(length))
+                    self._respond(writer, *await self._run_command(body))
+                else:
+                    self._respond(writer, 400, {"ok": False, "error": "invalid Content-Length"})
+            else:
+                self._respond(writer, 404, {"ok": False, "error": "not found"})
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            # Cliente saiu ou servidor encerrando
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    def _authorized(self, headers, query):
+        """Token from the Authorization header or the ?token= parameter"""
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer":
+            token = parse_qs(query).get("token", [""])[0]
+        return hmac.compare_digest(token.encode(), self.token.encode())
+
+    def _respond(self, writer, status, data):
+        body = encode_json(data)
+        reason = {
+            200: "OK", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden",
+            404: "Not Found", 500: "Internal Server Error",
+        }[status]
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + body
+        )
+
+    async def _handle_websocket(self, reader, writer, headers):
+        key = headers.get("sec-websocket-key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode("latin-1")
+        )
+        # Estado completo primeiro, depois só deltas
+        writer.write(ws_frame(encode_json(self.controller.state())))
+        self.clients.add(writer)
+
+        while True:
+            opcode, payload = await read_ws_frame(reader)
+            if opcode == 0x8:
+                writer.write(ws_frame(b"", 0x8))
+                return
+            if opcode == 0x9:
+                writer.write(ws_frame(payload, 0xA))
+            elif opcode == 0x1:
+                status, reply = await self._run_command(payload)
+                if status != 200:
+                    writer.write(ws_frame(encode_json({"error": reply["error"]})))
+
+
+def start(controller, host=HOST, port=PORT):
+    """Start the control API for the shared controller"""
+    server = ControlServer(controller, host, port)
+    server.start()
+    return server
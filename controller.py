@@ -0,0 +1,838 @@
+# Estado e comandos do player compartilhados por todas as interfaces conectadas
+
+# Import required libraries
+import os
+import threading
+import time
+from collections import deque
+
+from engine import PlaybackEngine, SdlSink
+from equalizer import EQ_PATH, Equalizer, PRESETS
+import decoder
+import fingerprint
+import history
+from metadata import METADATA_PATH, MetadataCache
+from play_queue import PlayQueue
+from prefetch import Prefetcher, PREFETCH_DEPTH
+import resampler
+import session
+from silence import SilenceScanner
+from smart_playlists import SMART_PLAYLISTS_PATH, SmartPlaylists
+from visualizer import SpectrumAnalyzer
+
+# Intervalo de publicação da posição enquanto toca
+POSITION_INTERVAL = 0.1
+
+# Comandos que clientes externos podem chamar
+COMMANDS = {
+    "play_pause", "play", "pause", "stop", "next_track", "prev_track",
+    "toggle_loop", "toggle_random", "toggle_mute", "set_volume", "seek", "set_tracks",
+    "remove_tracks", "show_visualizer", "hide_visualizer",
+    "set_eq_preset", "set_eq_band", "set_track_eq", "toggle_skip_silence",
+    "toggle_weighted_shuffle", "define_smart_playlist", "delete_smart_playlist",
+    "play_smart_playlist", "set_quality",
+}
+
+
+class _Subscriber:
+    """Runs a callback in its own thread, merging the deltas it has not taken
+    yet: a slow window gets fewer, newer updates and holds up nobody else"""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self._pending = {}
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __call__(self, delta):
+        with self._condition:
+            self._pending.update(delta)
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                delta, self._pending = self._pending, {}
+            try:
+                self.callback(delta)
+            except Exception as e:
+                print(f"Erro ao notificar interface: {e}")
+
+
+class PlayerController:
+    """One engine and one position stream, shared by every UI and client"""
+
+    def __init__(self, engine=None, sink=None, session_path=session.SESSION_PATH, quality=None,
+                 history_path=history.HISTORY_PATH, metadata_path=METADATA_PATH,
+                 fingerprint_path=fingerprint.CACHE_PATH, smart_playlists_path=SMART_PLAYLISTS_PATH,
+                 eq_path=EQ_PATH):
+        # Qualidade do resampler: argumento > MUSIC_PLAYER_QUALITY > sessão > padrão
+        self._quality_fixed = quality or resampler.quality_from_env()
+        self.engine = engine or PlaybackEngine(quality=self._quality_fixed or resampler.DEFAULT_QUALITY)
+        if engine is not None and quality:
+            self.engine.quality = quality
+        self.sink = sink if sink is not None else SdlSink(self.engine)
+        self.sink.start()
+        self.prefetcher = Prefetcher()
+        self.session_store = session.SessionStore(session_path)
+        # Início/fim do som de cada faixa, analisados em segundo plano
+        self.silence = SilenceScanner(MetadataCache(metadata_path), on_result=self._on_silence_result)
+        # Histórico de reprodução (alimenta o modo aleatório ponderado): lido em
+        # segundo plano depois de restaurar a sessão, None até lá
+        self.history = None
+        self._history_path = history_path
+        self._history_track = None
+        self._history_start = 0.0
+        self._history_frames = 0
+        # Reproduções terminadas antes de o histórico ficar pronto
+        self._early_plays = []
+        # Playlists inteligentes sobre tudo que já foi analisado ou tocado (a
+        # biblioteca é montada junto com o histórico)
+        self.smart = SmartPlaylists(smart_playlists_path)
+        self._fingerprint_path = fingerprint_path
+        self._library_ready = threading.Event()
+        # Mudanças de membros anotadas pelas playlists e aplicadas pelo ticker
+        self._smart_changes = deque()
+        # Playlist inteligente que a fila está seguindo (None para arquivos escolhidos)
+        self._smart_playing = None
+        # Entrada na biblioteca e busca de duplicadas, uma escolha de arquivos por vez
+        self._library_lock = threading.Lock()
+        self.queue = PlayQueue()
+        self.durations = {}
+        # Fila e durações já gravadas (versão da fila, versão das durações)
+        self._durations_version = 0
+        self._saved_queue = None
+
+        # Estado do player
+        self.current_track = None
+        self.is_playing = False
+        self.is_loop = False
+        self.is_random = False
+        self.is_weighted = False
+        self.is_muted = False
+        self.skip_silence = True
+        self.volume = 100.0
+        self.last_volume = 100.0
+        self.current_position = 0
+        self.track_duration = 0
+        # Parado (não pausado): o próximo play recomeça a faixa
+        self._stopped = False
+        # Visualizador: só fica ligado ao motor enquanto alguém o exibe
+        self.analyzer = SpectrumAnalyzer(self.engine.rate)
+        self.meter = None
+        self._visualizer_users = 0
+        # Equalizador: estágio de DSP do motor, com preset e ajustes por faixa
+        self.equalizer = Equalizer(self.engine.rate, self.engine.channels)
+        self._eq_path = eq_path
+        self.equalizer.load(eq_path)
+        self.engine.stages.append(self.equalizer.process)
+
+        self._subscribers = []
+        self._published = {}
+        self._dedupe_generation = 0
+        # Faixa seguinte decodificada com antecedência (troca sem pausa)
+        self._preloaded = None
+        # Carregamentos mais antigos que o último pedido são descartados
+        self._load_generation = 0
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+
+        self.engine.on_track_end = self.handle_track_end
+        self.engine.on_track_change = self.handle_track_change
+        self.restore_session()
+        # Processos do SDL_mixer sobem já: o primeiro MP3 não espera por eles
+        decoder.start_workers()
+        # Índices do histórico e biblioteca depois da sessão: a janela abre antes
+        self._loader = threading.Thread(target=self._load_history_and_library, daemon=True)
+        self._loader.start()
+
+        # Uma única thread publica a posição para todos os inscritos
+        self._ticker = threading.Thread(target=self._tick, daemon=True)
+        self._ticker.start()
+
+    # Estado publicado
+
+    def state(self):
+        """Full public state"""
+        return {
+            "track": self.current_track,
+            "title": os.path.basename(self.current_track) if self.current_track else None,
+            "index": self.queue.current_index,
+            "queue_length": len(self.queue),
+            "is_playing": self.is_playing,
+            "is_loop": self.is_loop,
+            "is_random": self.is_random,
+            "is_weighted": self.is_weighted,
+            "is_muted": self.is_muted,
+            "skip_silence": self.skip_silence,
+            "volume": self.volume,
+            "quality": self.engine.quality,
+            # Níveis só valem para formatos decodificados aqui (WAV); MP3/OGG
+            # chegam já reamostrados pelo SDL_mixer
+            "quality_applies": bool(self.current_track) and decoder.is_native(self.current_track),
+            # Arredondado: deltas menores e menos mensagens
+            "position": round(self.current_position, 1),
+            "duration": round(self.track_duration, 1),
+            "meter": self.meter,
+            "eq_preset": self.equalizer.preset,
+            "eq_gains": self.equalizer.gains,
+            "smart_playlists": self.smart.counts(),
+        }
+
+    def subscribe(self, callback, threaded=True):
+        """Call callback(delta) on every state change; returns an unsubscribe function.
+        By default the callback runs in its own thread with pending deltas merged,
+        so a slow UI never blocks publish(); threaded=False calls it in place
+        (only for callbacks that return at once)"""
+        subscriber = _Subscriber(callback) if threaded else callback
+        with self._lock:
+            self._subscribers.append(subscriber)
+
+        def unsubscribe():
+            with self._lock:
+                if subscriber in self._subscribers:
+                    self._subscribers.remove(subscriber)
+            if threaded:
+                subscriber.close()
+        return unsubscribe
+
+    def publish(self):
+        """Send only the fields that changed since the last publish"""
+        with self._lock:
+            current = self.state()
+            delta = {k: v for k, v in current.items() if self._published.get(k, object()) != v}
+            if not delta:
+                return
+            self._published = current
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(delta)
+            except Exception as e:
+                print(f"Erro ao notificar interface: {e}")
+
+    def _tick(self):
+        while not self._closed.wait(POSITION_INTERVAL):
+            if self._smart_changes:
+                self._apply_smart_changes()
+            if self.is_playing:
+                # Posição realmente ouvida (frames consumidos menos a latência)
+                self.current_position = min(self.engine.position, self.track_duration)
+                if self._visualizer_users:
+                    self.meter = self.analyzer.compute()
+                self.save_session()
+                self.publish()
+
+    # Sessão
+
+    def save_session(self):
+        """Schedule a session save; the queue is copied and rewritten only when it changed"""
+        state = {
+            "queue_position": self.queue.position,
+            "is_loop": self.is_loop,
+            "is_random": self.is_random,
+            "is_weighted": self.is_weighted,
+            "is_muted": self.is_muted,
+            "skip_silence": self.skip_silence,
+            "volume": float(self.volume),
+            "quality": self.engine.quality,
+            "last_volume": float(self.last_volume),
+            "position": float(self.current_position),
+        }
+        version = (self.queue.version, self._durations_version)
+        if version != self._saved_queue:
+            self._saved_queue = version
+            # Cópias: a gravação acontece em outra thread
+            state.update(tracks=list(self.queue.tracks), order=list(self.queue.order),
+                         durations=dict(self.durations))
+        self.session_store.save_later(state)
+
+    def _set_duration(self, path, duration):
+        if self.durations.get(path) != duration:
+            self.durations[path] = duration
+            self._durations_version += 1
+
+    def restore_session(self):
+        """Restore the last session without decoding any file"""
+        state = session.load(self.session_store.path)
+        if state and state["quality"] and not self._quality_fixed:
+            self.engine.quality = state["quality"]
+        if not state or not state["tracks"]:
+            return
+
+        self.queue.restore(state["tracks"], state["order"], state["queue_position"], state["is_random"])
+        self.durations.update(state["durations"])
+        self.current_track = self.queue.current_track
+        self.is_loop = state["is_loop"]
+        self.is_random = state["is_random"]
+        # Os pesos do aleatório ponderado chegam com o histórico
+        self.is_weighted = state["is_weighted"]
+        self.is_muted = state["is_muted"]
+        self.skip_silence = state["skip_silence"]
+        self.volume = state["volume"]
+        self.last_volume = state["last_volume"]
+        self.current_position = state["position"]
+        # A faixa só é decodificada quando o usuário der play
+        self.track_duration = self.durations.get(self.current_track, 0)
+        # O que está em disco é esta fila: só o registro pequeno até ela mudar
+        self._saved_queue = (self.queue.version, self._durations_version)
+        self.prefetcher.schedule([self.current_track] + self.queue.upcoming(PREFETCH_DEPTH))
+        self.silence.schedule([self.current_track] + self.queue.upcoming(PREFETCH_DEPTH))
+
+    # Biblioteca
+
+    def _library_fields(self, paths, cached):
+        """Columns for the smart playlists: cached analysis plus play statistics"""
+        stats = self.history.stats(paths)
+        fields = {}
+        for i, path in enumerate(paths):
+            values = dict(cached.get(path, {}))
+            values["plays"] = stats["plays"][i]
+            values["last_played"] = stats["last_played"][i]
+            fields[path] = values
+        return fields
+
+    def _load_history_and_library(self):
+        """Build the history rollups and the library, then publish the counts"""
+        log = history.HistoryLog(self._history_path)
+        with self._lock:
+            self.history = log
+            for track, start, ms, completed in self._early_plays:
+                self._log_play(track, start, ms, completed)
+            self._early_plays = []
+            if self.is_weighted and self.queue.weights is None:
+                # Sem reembaralhar: a ordem atual continua valendo
+                self.queue.weights = self.history.weights(self.queue.tracks)
+        with self._library_lock:
+            cached = self.silence.cache.items()
+            paths = list(dict.fromkeys(list(cached) + log.paths))
+            self.smart.add_tracks(paths, self._library_fields(paths, cached))
+            self.smart.on_change = self._on_smart_change
+        self._library_ready.set()
+        self.publish()
+
+    def _weights(self, paths):
+        """Weighted shuffle weights, or None until the history is loaded"""
+        return self.history.weights(paths) if self.history is not None else None
+
+    def _index_tracks(self, paths, generation):
+        """Add picked files to the library, then drop re-encoded copies, in this
+        order (adding after the removal would bring the copies back)"""
+        self._library_ready.wait()
+        with self._library_lock:
+            self._add_to_library(paths)
+            # Cópias com outra codificação: impressão digital
+            if len(paths) > 1:
+                self._dedupe(paths, generation)
+
+    def _add_to_library(self, paths):
+        """Add picked files to the library and analyze the new ones in the background"""
+        new = [p for p in paths if p not in self.smart.library.rows]
+        cached = self.silence.cache.get_many(new)
+        self.smart.add_tracks(paths, self._library_fields(new, cached))
+        self.silence.scan([p for p in new if p not in cached])
+        self.publish()
+
+    def _on_smart_change(self, name, added, removed):
+        # Chamado com a trava das playlists: só anota (pegar a do controller aqui
+        # inverteria a ordem das travas)
+        self._smart_changes.append((name, added, removed))
+
+    def _apply_smart_changes(self):
+        """Publish the new member counts and keep a queue playing a smart playlist in sync"""
+        with self._lock:
+            changed = False
+            while self._smart_changes:
+                name, added, removed = self._smart_changes.popleft()
+                if name != self._smart_playing:
+                    continue
+                self.queue.add_tracks(added)
+                self.queue.remove_tracks(removed)
+                changed = True
+            if changed and self.queue:
+                if self.current_track is None:
+                    self.current_track = self.queue.current_track
+                self.prefetcher.schedule(self.queue.upcoming(PREFETCH_DEPTH))
+                self._preload_next()
+                self.save_session()
+        self.publish()
+
+    # Histórico
+
+    def _start_play(self):
+        """Start the history entry of the current track"""
+        self._history_track = self.current_track
+        self._history_start = time.time()
+        self._history_frames = self.engine.played_frames
+
+    def _finish_play(self, completed):
+        """Log the track that was playing (skipped unless it reached the end)"""
+        track, self._history_track = self._history_track, None
+        if track is None:
+            return
+        ms = int((self.engine.played_frames - self._history_frames) * 1000 / self.engine.rate)
+        if ms > 0 or completed:
+            if self.history is None:
+                # Histórico ainda carregando: gravado quando ele ficar pronto
+                self._early_plays.append((track, self._history_start, ms, completed))
+            else:
+                self._log_play(track, self._history_start, ms, completed)
+
+    def _log_play(self, track, start, ms, completed):
+        self.history.record(track, start, ms, completed)
+        stats = self.history.stats([track])
+        self.smart.update_track(track, {"plays": stats["plays"][0], "last_played": stats["last_played"][0]})
+
+    # Silêncio no início e no fim
+
+    def _apply_silence_bounds(self, fields):
+        """Start and end the loaded track where its sound does"""
+        if self.skip_silence and fields:
+            self.engine.set_bounds(fields["lead"], fields["tail"])
+        else:
+            self.engine.set_bounds(0, self.engine.duration)
+
+    def _on_silence_result(self, path, fields):
+        self.smart.update_track(path, fields)
+        # Análise da faixa que já está tocando: aplica sem recarregar
+        with self._lock:
+            if path == self.current_track and self.engine.path == path:
+                self._apply_silence_bounds(fields)
+            if self._preloaded is not None and self._preloaded.path == path:
+                # Faixa já na fila do motor: entra com os novos limites
+                self._preload_next()
+
+    # Troca sem pausa
+
+    def _drop_preloaded(self):
+        track, self._preloaded = self._preloaded, None
+        if track is not None and track is not self.engine.track:
+            track.cancel()
+
+    def _take_preloaded(self, path):
+        """The track decoded ahead for path, if any (the engine queue is cleared)"""
+        track, self._preloaded = self._preloaded, None
+        self.engine.queue_next(None)
+        if track is not None and track.path == path and track.error is None:
+            return track
+        if track is not None and track is not self.engine.track:
+            track.cancel()
+        return None
+
+    def _preload_next(self):
+        """Start decoding the track that follows the current one and queue it
+        in the engine, so the change at the end has no gap"""
+        if self.engine.path is None or self.engine.path != self.current_track:
+            self._drop_preloaded()
+            self.engine.queue_next(None)
+            return
+        path = self.current_track if self.is_loop else self.queue.peek_next()
+        if path is None:
+            # Fim de uma volta embaralhada: a próxima só existe depois de sortear
+            self._drop_preloaded()
+            self.engine.queue_next(None)
+            return
+        if path == self.engine.path:
+            track = self.engine.track
+        elif self._preloaded is not None and self._preloaded.path == path:
+            track = self._preloaded
+        else:
+            self._drop_preloaded()
+            track = self.engine.open(path)
+        self._preloaded = track
+        fields = self.silence.lookup(path)
+        if self.skip_silence and fields:
+            self.engine.queue_next(track, fields["lead"], fields["tail"])
+        else:
+            self.engine.queue_next(track)
+
+    # Comandos
+
+    def set_tracks(self, paths):
+        """Replace the playlist with the given files"""
+        self._set_tracks(paths)
+
+    def _set_tracks(self, paths, smart=None):
+        """Replace the playlist; a queue built from the smart playlist `smart`
+        follows it and skips indexing (its tracks are already in the library,
+        without duplicates)"""
+        # O mesmo arquivo escolhido duas vezes sai já aqui
+        paths = list(dict.fromkeys(paths))
+        with self._lock:
+            if not paths:
+                return
+            self.queue.set_tracks(paths)
+            # A fila acompanha a playlist: faixas que entram ou saem dela
+            self._smart_playing = smart
+            if self.is_weighted:
+                self.queue.set_weights(self._weights(paths))
+            self.current_track = self.queue.current_track
+            self.prefetcher.schedule([self.current_track] + self.queue.upcoming(PREFETCH_DEPTH))
+            self.silence.schedule([self.current_track] + self.queue.upcoming(PREFETCH_DEPTH))
+            self._preload_next()
+            self.save_session()
+            # Uma busca de duplicadas ainda rodando não mexe mais na fila
+            self._dedupe_generation += 1
+            generation = self._dedupe_generation
+        self.publish()
+
+        if smart is None:
+            threading.Thread(target=self._index_tracks, args=(paths, generation), daemon=True).start()
+
+    def _dedupe(self, paths, generation):
+        try:
+            groups = fingerprint.find_duplicates(paths, cache_path=self._fingerprint_path)
+        except Exception as e:
+            print(f"Erro ao procurar duplicadas: {e}")
+            return
+        duplicates = [path for copies in groups.values() for path in copies]
+        if not duplicates:
+            return
+        # A biblioteca fica com uma cópia de cada música, seja qual for a fila agora
+        self.smart.remove_tracks(duplicates)
+        # Ignorar o resultado na fila se outra playlist foi escolhida nesse meio tempo
+        if generation == self._dedupe_generation:
+            self.remove_tracks(duplicates)
+
+    def remove_tracks(self, paths):
+        """Remove tracks from the playlist (the current one keeps playing); the
+        library behind the smart playlists keeps them"""
+        with self._lock:
+            self.queue.remove_tracks(paths)
+            self.prefetcher.schedule(self.queue.upcoming(PREFETCH_DEPTH))
+            self._preload_next()
+            self.save_session()
+        self.publish()
+
+    def define_smart_playlist(self, name, rules, match="all"):
+        """Create or replace a smart playlist (rules: see smart_playlists.validate_rule)"""
+        self.smart.define(name, rules, match)
+        self.publish()
+
+    def delete_smart_playlist(self, name):
+        self.smart.delete(name)
+        with self._lock:
+            if self._smart_playing == name:
+                self._smart_playing = None
+        self.publish()
+
+    def play_smart_playlist(self, name):
+        """Replace the queue with the current members of a smart playlist and play it"""
+        if name not in self.smart.playlists:
+            raise ValueError(f"Playlist inteligente desconhecida: {name}")
+        # Logo depois de abrir a biblioteca ainda pode estar sendo montada
+        self._library_ready.wait()
+        # Regras de "tocada há N dias" mudam com o tempo: reavaliar antes
+        self.smart.refresh()
+        paths = self.smart.members(name)
+        if not paths:
+            return
+        self._set_tracks(paths, smart=name)
+        self.play_current_track()
+
+    def show_visualizer(self):
+        """Start tapping the playback blocks for the spectrum and meters"""
+        with self._lock:
+            self._visualizer_users += 1
+            if self._visualizer_users == 1:
+                self.engine.taps.append(self.analyzer.feed)
+
+    def hide_visualizer(self):
+        """Stop tapping when nobody shows the visualizer (no cost while hidden)"""
+        with self._lock:
+            if self._visualizer_users == 0:
+                return
+            self._visualizer_users -= 1
+            if self._visualizer_users == 0:
+                self.engine.taps.remove(self.analyzer.feed)
+                self.meter = None
+        self.publish()
+
+    def set_eq_preset(self, name):
+        """Select an EQ preset (tracks with their own settings keep them)"""
+        if name not in PRESETS:
+            raise ValueError(f"Preset desconhecido: {name}")
+        with self._lock:
+            self.equalizer.preset = name
+            self.equalizer.use_track(self.current_track)
+            self.equalizer.save(self._eq_path)
+        self.publish()
+
+    def set_eq_band(self, index, gain):
+        """Change one band for the current track only"""
+        with self._lock:
+            self.equalizer.set_band(int(index), gain=gain)
+            self.equalizer.overrides[self.current_track] = self.equalizer.gains
+            self.equalizer.save(self._eq_path)
+        self.publish()
+
+    def set_track_eq(self, gains=None):
+        """Set (or clear, with None) the EQ override of the current track"""
+        with self._lock:
+            if gains is None:
+                self.equalizer.overrides.pop(self.current_track, None)
+            else:
+                self.equalizer.overrides[self.current_track] = [float(g) for g in gains]
+            self.equalizer.use_track(self.current_track)
+            self.equalizer.save(self._eq_path)
+        self.publish()
+
+    def play_pause(self):
+        if self.is_playing:
+            self.pause()
+        else:
+            self.play()
+
+    def play(self):
+        with self._lock:
+            if not self.current_track or self.is_playing:
+                return
+            loaded = self.engine.path == self.current_track
+            if loaded:
+                if self._stopped:
+                    # Depois do stop o cursor voltou ao frame 0: recomeça no início do som
+                    self._stopped = False
+                    self._apply_silence_bounds(self.silence.lookup(self.current_track))
+                    # O stop encerrou a entrada do histórico: esta reprodução é outra
+                    self._start_play()
+                # Resume playback de onde parou
+                self.engine.play()
+                self.is_playing = True
+        if not loaded:
+            # Sessão restaurada: carregar a faixa e continuar da posição salva
+            self.play_current_track(self.current_position)
+            return
+        self.publish()
+
+    def pause(self):
+        with self._lock:
+            if not self.is_playing:
+                return
+            self.engine.pause()
+            self.is_playing = False
+            self.save_session()
+        self.publish()
+
+    def stop(self):
+        with self._lock:
+            self._finish_play(False)
+            self.engine.stop()
+            self._stopped = True
+            self.is_playing = False
+            self.current_position = 0
+            self.save_session()
+        self.publish()
+
+    def seek(self, seconds):
+        with self._lock:
+            self.engine.seek(seconds)
+            self.current_position = min(max(float(seconds), 0), self.track_duration)
+            self.save_session()
+        self.publish()
+
+    def prev_track(self):
+        with self._lock:
+            if not self.queue:
+                return
+            # A fila já segue a permutação quando o modo aleatório está ativo
+            self.current_track = self.queue.prev()
+        self.play_current_track()
+
+    def next_track(self):
+        with self._lock:
+            if not self.queue:
+                return
+            self.current_track = self.queue.next()
+        self.play_current_track()
+
+    def handle_track_end(self):
+        """Handle track end event (called by the engine when a track finishes)"""
+        with self._lock:
+            self._finish_play(True)
+        if self.is_loop:
+            self.play_current_track()
+        else:
+            self.next_track()
+
+    def handle_track_change(self):
+        """Follow a gapless change (called by the engine when the queued track starts)"""
+        with self._lock:
+            self._finish_play(True)
+            self._preloaded = None
+            if not self.is_loop:
+                self.queue.next()
+            self.current_track = self.queue.current_track
+            # A fila mudou depois do pré-carregamento: tocar o que ela indica
+            reload = self.current_track != self.engine.path
+            if not reload:
+                if self.silence.lookup(self.current_track) is None:
+                    self.silence.submit(self.current_track, self.engine.track)
+                self.equalizer.use_track(self.current_track)
+                self._start_play()
+                self.prefetcher.schedule(self.queue.upcoming(PREFETCH_DEPTH))
+                self.silence.schedule(self.queue.upcoming(PREFETCH_DEPTH))
+                self.track_duration = self.engine.duration
+                self._set_duration(self.current_track, self.track_duration)
+                self.current_position = min(self.engine.position, self.track_duration)
+                self._preload_next()
+                self.save_session()
+        if reload:
+            self.play_current_track()
+            return
+        self.publish()
+
+    def play_current_track(self, start_position=0):
+        with self._lock:
+            # Pular de faixa cancela o pré-carregamento em andamento
+            self.prefetcher.cancel()
+            self._load_generation += 1
+            generation = self._load_generation
+            path = self.current_track
+            track = self._take_preloaded(path) or self.engine.open(path)
+
+        # Fora da trava: a faixa atual e a interface seguem enquanto o primeiro
+        # bloco decodifica; o resto é decodificado durante a reprodução
+        load_start = time.perf_counter()
+        try:
+            track.wait_ready()
+        except Exception as e:
+            print(f"Erro ao reproduzir: {e}")
+            return
+        first_sample = time.perf_counter() - load_start
+
+        with self._lock:
+            if generation != self._load_generation:
+                # Outra faixa foi pedida enquanto esta decodificava
+                if track is not self.engine.track:
+                    track.cancel()
+                return
+            self._finish_play(False)
+            self._stopped = False
+            self.engine.load_track(track)
+            fields = self.silence.lookup(path)
+            if fields is None:
+                # Ainda não analisada: a análise usa a decodificação em andamento
+                self.silence.submit(path, track)
+            self._apply_silence_bounds(fields)
+            if start_position:
+                self.engine.seek(start_position)
+            self.equalizer.use_track(path)
+            self._start_play()
+            self.engine.play()
+            self.prefetcher.record_first_sample(path, first_sample)
+            self.prefetcher.schedule(self.queue.upcoming(PREFETCH_DEPTH))
+            self.silence.schedule(self.queue.upcoming(PREFETCH_DEPTH))
+            self.is_playing = True
+
+            # Duração da faixa (WAV: conhecida antes do fim da decodificação)
+            self.track_duration = self.engine.duration
+            self._set_duration(path, self.track_duration)
+            self.current_position = start_position
+            self._preload_next()
+            self.save_session()
+        self.publish()
+
+    def toggle_loop(self):
+        with self._lock:
+            self.is_loop = not self.is_loop
+            self._preload_next()
+            self.save_session()
+        self.publish()
+
+    def toggle_random(self):
+        with self._lock:
+            self.is_random = not self.is_random
+            self.queue.set_shuffle(self.is_random)
+            self.prefetcher.schedule(self.queue.upcoming(PREFETCH_DEPTH))
+            self._preload_next()
+            self.save_session()
+        self.publish()
+
+    def toggle_weighted_shuffle(self):
+        """Shuffle favouring tracks often played to the end over skipped or recent ones"""
+        with self._lock:
+            self.is_weighted = not self.is_weighted
+            self.queue.set_weights(self._weights(self.queue.tracks) if self.is_weighted else None)
+            self.prefetcher.schedule(self.queue.upcoming(PREFETCH_DEPTH))
+            self.silence.schedule(self.queue.upcoming(PREFETCH_DEPTH))
+            self._preload_next()
+            self.save_session()
+        self.publish()
+
+    def set_quality(self, quality):
+        """Resampler tier for the next decoded tracks (low saves CPU on weak machines).
+        Only natively decoded formats (decoder.NATIVE_FORMATS) are affected"""
+        if quality not in resampler.QUALITY_TIERS:
+            raise ValueError(f"Qualidade desconhecida: {quality}")
+        with self._lock:
+            self.engine.quality = quality
+            self.save_session()
+        self.publish()
+
+    def toggle_skip_silence(self):
+        with self._lock:
+            self.skip_silence = not self.skip_silence
+            if self.engine.path == self.current_track:
+                self._apply_silence_bounds(self.silence.lookup(self.current_track))
+            self._preload_next()
+            self.save_session()
+        self.publish()
+
+    def set_volume(self, volume):
+        with self._lock:
+            self.volume = float(volume)
+            self.save_session()
+        self.publish()
+
+    def toggle_mute(self):
+        with self._lock:
+            self.is_muted = not self.is_muted
+            if self.is_muted:
+                self.last_volume = self.volume
+                self.volume = 0.0
+            else:
+                self.volume = self.last_volume
+            self.save_session()
+        self.publish()
+
+    def close(self):
+        """Stop the ticker, background workers and the audio device"""
+        self._closed.set()
+        self._ticker.join()
+        self._loader.join()
+        with self._lock:
+            for subscriber in self._subscribers:
+                if isinstance(subscriber, _Subscriber):
+                    subscriber.close()
+            self._finish_play(False)
+            self._drop_preloaded()
+            self.save_session()
+        self.history.close()
+        self.prefetcher.close()
+        self.silence.close()
+        self.session_store.close()
+        self.sink.close()
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller(quality=None):
+    """Shared controller, created on first use (quality only applies then)"""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = PlayerController(quality=quality)
+        return _controller
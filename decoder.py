@@ -0,0 +1,288 @@
+# Decodificação de arquivos de áudio para PCM float32
+
+# Import required libraries
+import io
+import multiprocessing
+import os
+import threading
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import resampler
+
+# Trecho do arquivo lido por vez na decodificação em blocos
+STREAM_SECONDS = 1.0
+# MP3 com limite de duração: só os bytes que cabem nela a 320 kbps (o máximo)
+MP3_MAX_BYTES_PER_SECOND = 320000 // 8
+MP3_MARGIN_BYTES = 64 * 1024
+# Formatos decodificados aqui na taxa original: só eles passam pelo resampler
+# polifásico (e pelos níveis de qualidade). O resto chega do SDL_mixer já
+# convertido para a taxa do mixer, pelo resampler interno dele
+NATIVE_FORMATS = (".wav",)
+# O SDL_mixer entrega o arquivo inteiro de uma vez: limite de PCM guardado por
+# faixa (20 min em float32 estéreo a 44,1 kHz ≈ 420 MB; o MP3 é lido só até aí)
+MAX_PCM_SECONDS = 20 * 60
+# Processos que decodificam pelo SDL_mixer (atual + pré-carregada)
+DECODE_WORKERS = 2
+
+_pool = None
+_pool_lock = threading.Lock()
+# Verdadeiro nos processos de decodificação (init_worker)
+_in_worker = False
+
+
+def is_native(path):
+    """True when the track is resampled by our polyphase filter (quality tiers apply)"""
+    return Path(path).suffix.lower() in NATIVE_FORMATS
+
+
+def read_wav(path, max_seconds=None):
+    """Read a PCM WAV file as a (frames, channels) float32 array and its rate"""
+    with wave.open(str(path), "rb") as f:
+        rate = f.getframerate()
+        channels = f.getnchannels()
+        width = f.getsampwidth()
+        frames = f.getnframes()
+        if max_seconds is not None:
+            # Só o início do arquivo é lido
+            frames = min(frames, int(max_seconds * rate))
+        data = f.readframes(frames)
+    return pcm_to_float(data, width).reshape(-1, channels), rate
+
+
+def pcm_to_float(data, width):
+    """Little-endian PCM bytes of the given sample width to float32 samples"""
+    if width == 1:
+        # WAV de 8 bits é sem sinal
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768
+    elif width == 3:
+        # 24 bits: monta inteiros de 32 bits a partir dos três bytes
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+        ints = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8)
+                | (raw[:, 2].astype(np.int8).astype(np.int32) << 16))
+        samples = ints.astype(np.float32) / 8388608
+    elif width == 4:
+        samples = np.frombuffer(data, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"Formato WAV não suportado: {width * 8} bits")
+    return samples
+
+
+def id3_size(header):
+    """Bytes taken by an ID3v2 tag from its 10-byte header (0 if there is none)"""
+    if len(header) < 10 or header[:3] != b"ID3":
+        return 0
+    # Tamanho "syncsafe": 7 bits por byte, mais o rodapé opcional
+    size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+    return 10 + size + (10 if header[5] & 0x10 else 0)
+
+
+def mp3_prefix(path, max_seconds):
+    """Start of an MP3 file holding at least max_seconds of audio, or None if
+    that is the whole file"""
+    with open(path, "rb") as f:
+        header = f.read(10)
+        size = id3_size(header) + int(max_seconds * MP3_MAX_BYTES_PER_SECOND) + MP3_MARGIN_BYTES
+        data = header + f.read(max(size - len(header), 0))
+        if not f.read(1):
+            return None
+    return data
+
+
+def init_worker():
+    """Process pool initializer: SDL_mixer decodes on the dummy driver, so no
+    sound card is opened"""
+    global _in_worker
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    _in_worker = True
+
+
+def _worker_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: um filho de fork herdaria o áudio do SDL já aberto pelo SdlSink
+            _pool = ProcessPoolExecutor(
+                max_workers=DECODE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker
+            )
+        return _pool
+
+
+def start_workers():
+    """Start the decode processes ahead of the first non-native track"""
+    for _ in range(DECODE_WORKERS):
+        _worker_pool().submit(int)
+
+
+def _decode_sdl(path, max_seconds):
+    """Decode with SDL_mixer in this process; returns (int samples, rate, bits)"""
+    import pygame
+
+    if not pygame.mixer.get_init():
+        pygame.mixer.init(
+            frequency=resampler.OUTPUT_RATE,
+            size=-16,
+            channels=resampler.OUTPUT_CHANNELS
+        )
+    rate, size, _ = pygame.mixer.get_init()
+    source = str(path)
+    if Path(path).suffix.lower() == ".mp3":
+        # Quadros MP3 são independentes: um prefixo decodifica como o início do arquivo
+        prefix = mp3_prefix(path, max_seconds)
+        if prefix is not None:
+            source = io.BytesIO(prefix)
+    samples = pygame.sndarray.array(pygame.mixer.Sound(file=source))
+    if samples.ndim == 1:
+        samples = samples[:, None]
+    return samples[:int(max_seconds * rate)], rate, abs(size)
+
+
+def decode_sdl(path, max_seconds=None):
+    """Decode any format SDL_mixer understands (already at the mixer rate) as
+    integer samples, their rate and bit depth. Runs in a worker process on the
+    dummy driver; at most MAX_PCM_SECONDS are returned. SDL_mixer resamples on
+    its own, so the quality tiers have no effect on these tracks"""
+    max_seconds = MAX_PCM_SECONDS if max_seconds is None else min(max_seconds, MAX_PCM_SECONDS)
+    if _in_worker:
+        return _decode_sdl(path, max_seconds)
+    return _worker_pool().submit(_decode_sdl, str(path), max_seconds).result()
+
+
+def decode_with_pygame(path, max_seconds=None):
+    """decode_sdl() as a (frames, channels) float32 array and its rate"""
+    samples, rate, bits = decode_sdl(path, max_seconds)
+    return samples.astype(np.float32) / float(2 ** (bits - 1)), rate
+
+
+def decode_file(path, rate=resampler.OUTPUT_RATE, channels=resampler.OUTPUT_CHANNELS, quality=resampler.DEFAULT_QUALITY, max_seconds=None):
+    """Decode a track and convert it to the output rate and channel layout"""
+    if is_native(path):
+        samples, src_rate = read_wav(path, max_seconds)
+    else:
+        samples, src_rate = decode_with_pygame(path, max_seconds)
+    return resampler.convert(samples, src_rate, rate, channels, quality)
+
+
+class DecodedTrack:
+    """Track PCM filled in by a background decode; readers use the first
+    `available` frames while the rest is still being converted"""
+
+    def __init__(self, path=None, rate=resampler.OUTPUT_RATE):
+        self.path = path
+        self.rate = rate
+        self.data = None
+        # Total de frames (conhecido antes do fim para WAV), None até lá
+        self.length = None
+        self.available = 0
+        self.error = None
+        self._ready = threading.Event()
+        self._done = threading.Event()
+        self._cancelled = False
+
+    @classmethod
+    def from_pcm(cls, samples, rate=resampler.OUTPUT_RATE, path=None):
+        """Wrap PCM that is already converted"""
+        track = cls(path, rate)
+        track.data = samples
+        track.length = track.available = len(samples)
+        track._ready.set()
+        track._done.set()
+        return track
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait_ready(self, timeout=None):
+        """Block until the first frames can be played"""
+        self._ready.wait(timeout)
+        if self.error is not None and self.available == 0:
+            raise self.error
+
+    def result(self):
+        """Whole PCM once decoding finished"""
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.data[:self.length]
+
+    def cancel(self):
+        """Stop decoding (the frames already decoded stay usable)"""
+        self._cancelled = True
+
+    def _append(self, block):
+        end = self.available + len(block)
+        if end > len(self.data):
+            # Estimativa curta: cresce (não acontece com cabeçalhos corretos)
+            grown = np.zeros((max(end, 2 * len(self.data)), self.data.shape[1]), dtype=np.float32)
+            grown[:self.available] = self.data[:self.available]
+            self.data = grown
+        self.data[self.available:end] = block
+        # Os dados ficam prontos antes de o leitor ver o novo total
+        self.available = end
+        if end:
+            self._ready.set()
+
+    def _decode(self, channels, quality):
+        try:
+            if is_native(self.path):
+                self._decode_wav(channels, quality)
+            else:
+                self._decode_sdl(channels, quality)
+        except Exception as e:
+            self.error = e
+            if self.data is not None:
+                self.length = self.available
+        finally:
+            self._done.set()
+            self._ready.set()
+
+    def _decode_wav(self, channels, quality):
+        with wave.open(str(self.path), "rb") as f:
+            src_rate = f.getframerate()
+            src_channels = f.getnchannels()
+            width = f.getsampwidth()
+            stream = resampler.StreamResampler(src_rate, self.rate, channels, quality)
+            self.length = stream.output_frames(f.getnframes())
+            self.data = np.zeros((self.length, channels), dtype=np.float32)
+            block = max(int(src_rate * STREAM_SECONDS), 1)
+            while not self._cancelled:
+                data = f.readframes(block)
+                samples = pcm_to_float(data, width).reshape(-1, src_channels)
+                final = len(samples) < block
+                self._append(stream.process(samples, final=final))
+                if final:
+                    break
+        # Arquivo truncado ou cancelado: vale o que foi decodificado
+        self.length = self.available
+
+
+    def _decode_sdl(self, channels, quality):
+        # O arquivo vem inteiro do processo de decodificação; a conversão para
+        # float32 é feita em blocos, sem uma segunda cópia da faixa inteira
+        samples, src_rate, bits = decode_sdl(self.path)
+        scale = 1 / float(2 ** (bits - 1))
+        stream = resampler.StreamResampler(src_rate, self.rate, channels, quality)
+        self.length = stream.output_frames(len(samples))
+        self.data = np.zeros((self.length, channels), dtype=np.float32)
+        block = max(int(src_rate * STREAM_SECONDS), 1)
+        for start in range(0, len(samples), block):
+            if self._cancelled:
+                break
+            chunk = samples[start:start + block].astype(np.float32) * scale
+            self._append(stream.process(chunk, final=start + block >= len(samples)))
+        self.length = self.available
+
+
+def open_track(path, rate=resampler.OUTPUT_RATE, channels=resampler.OUTPUT_CHANNELS, quality=resampler.DEFAULT_QUALITY):
+    """Start decoding a track in a background thread and return it right away"""
+    track = DecodedTrack(path, rate)
+    threading.Thread(target=track._decode, args=(channels, quality), daemon=True).start()
+    return track
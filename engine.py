@@ -0,0 +1,424 @@
+# Motor de reprodução em blocos com relógio baseado em frames consumidos
+
+# Import required libraries
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+import decoder
+import resampler
+
+# Frames pedidos pelo dispositivo a cada callback
+BLOCK_FRAMES = 1024
+
+
+class PlaybackClock:
+    """Track position derived from the frames the sink actually consumed"""
+
+    def __init__(self, rate, latency_frames=0):
+        self.rate = rate
+        self.latency_frames = latency_frames
+        # Frames entregues ao dispositivo desde a abertura (nunca volta)
+        self.consumed = 0
+        # Marcas (frame do dispositivo, frame da faixa, avançando?) em ordem
+        self._marks = deque([(0, 0, False)])
+        self._lock = threading.Lock()
+
+    def mark(self, device_frame, track_frame, advancing):
+        """Record that track_frame is written at device_frame"""
+        with self._lock:
+            # Uma marca nova substitui as que ainda não foram ouvidas depois dela
+            while self._marks and self._marks[-1][0] >= device_frame:
+                self._marks.pop()
+            self._marks.append((device_frame, track_frame, advancing))
+
+    def advance(self, frames):
+        """Count frames handed to the device"""
+        self.consumed += frames
+
+    def heard_frame(self):
+        """Device frame currently leaving the speaker"""
+        return max(0, self.consumed - self.latency_frames)
+
+    def position_frames(self):
+        """Track frames heard so far, corrected for device latency"""
+        heard = self.heard_frame()
+        with self._lock:
+            while len(self._marks) > 1 and self._marks[1][0] <= heard:
+                self._marks.popleft()
+            device_frame, track_frame, advancing = self._marks[0]
+        if advancing and heard > device_frame:
+            return track_frame + heard - device_frame
+        return track_frame
+
+    @property
+    def position(self):
+        """Track position in seconds"""
+        return self.position_frames() / self.rate
+
+    @property
+    def elapsed(self):
+        """Monotonic time in seconds since the device was opened"""
+        return self.heard_frame() / self.rate
+
+
+class PlaybackEngine:
+    """Block based player: decodes, converts and renders PCM on demand"""
+
+    def __init__(self, rate=resampler.OUTPUT_RATE, channels=resampler.OUTPUT_CHANNELS, quality=resampler.DEFAULT_QUALITY):
+        self.rate = rate
+        self.channels = channels
+        self.quality = quality
+        self.clock = PlaybackClock(rate)
+        self.is_playing = False
+        # Chamado (em outra thread) quando a faixa termina sem próxima na fila
+        self.on_track_end = None
+        # Chamado (em outra thread) depois de uma troca gapless para a faixa da fila
+        self.on_track_change = None
+        # Estágios de DSP aplicados em ordem a cada bloco (ex.: equalizador)
+        self.stages = []
+        # Funções chamadas com cada bloco entregue ao dispositivo (ex.: visualizador)
+        self.taps = []
+        self._track = None
+        self._next = None
+        self._cursor = 0
+        # Frame onde a faixa termina (antes do fim em silêncio, se marcado)
+        self._end = None
+        # Frames de faixa realmente entregues (tempo ouvido, sem pausas)
+        self.played_frames = 0
+        # Cursor alcançou a decodificação: silêncio sem avançar o relógio
+        self._starved = False
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _frames(track):
+        """Known length of a track, or what was decoded so far"""
+        return track.length if track.length is not None else track.available
+
+    @property
+    def track(self):
+        """Current DecodedTrack (None if nothing is loaded)"""
+        return self._track
+
+    @property
+    def path(self):
+        """File of the current track (None for PCM loaded directly)"""
+        return self._track.path if self._track is not None else None
+
+    @property
+    def duration(self):
+        """Current track length in seconds"""
+        if self._track is None:
+            return 0
+        return self._frames(self._track) / self.rate
+
+    @property
+    def samples(self):
+        """PCM of the current track as (frames, channels), possibly still being filled"""
+        return self._track.data if self._track is not None else None
+
+    @property
+    def buffered_bytes(self):
+        """Bytes of PCM held for the current and the queued track"""
+        # Em loop a faixa seguinte é a mesma: conta uma vez só
+        tracks = {id(t): t for t in (self._track, self.queued) if t is not None and t.data is not None}
+        return sum(t.data.nbytes for t in tracks.values())
+
+    @property
+    def position(self):
+        """Current track position in seconds, as heard"""
+        return self.clock.position
+
+    def decode(self, path):
+        """Decode a file to the engine output format"""
+        return decoder.decode_file(path, self.rate, self.channels, self.quality)
+
+    def open(self, path):
+        """Start decoding a file in the background (see decoder.open_track)"""
+        return decoder.open_track(path, self.rate, self.channels, self.quality)
+
+    def load(self, path):
+        """Load a track and rewind it to the start (returns once the first block is decoded)"""
+        track = self.open(path)
+        track.wait_ready()
+        self.load_track(track)
+
+    def load_track(self, track):
+        """Make a DecodedTrack the current track; it may still be decoding"""
+        with self._lock:
+            self._track = track
+            self._next = None
+            self._cursor = 0
+            self._end = None
+            self._starved = False
+            self.clock.mark(self.clock.consumed, 0, self.is_playing)
+
+    def load_pcm(self, samples):
+        """Load an already converted (frames, channels) block as the current track"""
+        self.load_track(decoder.DecodedTrack.from_pcm(samples, self.rate))
+
+    def queue_next(self, track, start=0.0, end=None):
+        """Queue a track (DecodedTrack or converted PCM) to follow the current
+        one without a gap, played from start to end in seconds; None clears it"""
+        if track is not None and not isinstance(track, decoder.DecodedTrack):
+            track = decoder.DecodedTrack.from_pcm(track, self.rate)
+        with self._lock:
+            if track is None:
+                self._next = None
+                return
+            end_frame = None if end is None else max(int(end * self.rate), 0)
+            self._next = (track, int(start * self.rate), end_frame)
+
+    @property
+    def queued(self):
+        """DecodedTrack queued for the gapless change, or None"""
+        return self._next[0] if self._next else None
+
+    def set_bounds(self, start, end):
+        """Play the current track only between start and end (in seconds),
+        jumping ahead if the cursor is still before start"""
+        with self._lock:
+            if self._track is None:
+                return
+            self._end = max(int(end * self.rate), 0)
+            if self._track.length is not None:
+                self._end = min(self._end, self._track.length)
+            start_frame = min(int(start * self.rate), self._end)
+            if self._cursor < start_frame:
+                self._cursor = start_frame
+                self._starved = False
+                self.clock.mark(self.clock.consumed, self._cursor, self.is_playing)
+
+    def play(self):
+        with self._lock:
+            if self._track is None or self.is_playing:
+                return
+            self.is_playing = True
+            self._starved = False
+            self.clock.mark(self.clock.consumed, self._cursor, True)
+
+    def pause(self):
+        with self._lock:
+            if not self.is_playing:
+                return
+            self.is_playing = False
+            self.clock.mark(self.clock.consumed, self._cursor, False)
+
+    def stop(self):
+        with self._lock:
+            self.is_playing = False
+            self._cursor = 0
+            self.clock.mark(self.clock.consumed, 0, False)
+
+    def seek(self, seconds):
+        """Move the playback cursor to the given position"""
+        with self._lock:
+            if self._track is None:
+                return
+            self._cursor = min(max(int(seconds * self.rate), 0), self._frames(self._track))
+            self._starved = False
+            self.clock.mark(self.clock.consumed, self._cursor, self.is_playing)
+
+    def render(self, frames):
+        """Produce the next block for the sink and advance the clock"""
+        out = np.zeros((frames, self.channels), dtype=np.float32)
+        ended = changed = False
+        with self._lock:
+            written = 0
+            while self.is_playing and written < frames:
+                track = self._track
+                end = self._end if self._end is not None else track.length
+                # Lido antes dos dados: o decodificador preenche e só então publica
+                available = track.available
+                readable = available if end is None else min(end, available)
+                if self._cursor < readable:
+                    if self._starved:
+                        self._starved = False
+                        self.clock.mark(self.clock.consumed + written, self._cursor, True)
+                    chunk = track.data[self._cursor:min(self._cursor + frames - written, readable)]
+                    out[written:written + len(chunk)] = chunk
+                    written += len(chunk)
+                    self._cursor += len(chunk)
+                    self.played_frames += len(chunk)
+                    continue
+                device_frame = self.clock.consumed + written
+                finished = track.done and self._cursor >= track.available
+                if not finished and (end is None or self._cursor < end):
+                    # Decodificação atrás da reprodução: silêncio, posição parada
+                    if not self._starved:
+                        self._starved = True
+                        self.clock.mark(device_frame, self._cursor, False)
+                    break
+                if self._next is not None:
+                    # Transição gapless: a próxima faixa começa no mesmo bloco
+                    (self._track, self._cursor, self._end), self._next = self._next, None
+                    self.clock.mark(device_frame, self._cursor, True)
+                    changed = True
+                else:
+                    self.is_playing = False
+                    self.clock.mark(device_frame, self._cursor, False)
+                    ended = True
+            self.clock.advance(frames)
+
+        for stage in self.stages:
+            out = stage(out)
+        for tap in self.taps:
+            tap(out)
+        if ended and self.on_track_end:
+            # Não bloquear a thread de áudio
+            threading.Thread(target=self.on_track_end, daemon=True).start()
+        if changed and self.on_track_change:
+            threading.Thread(target=self.on_track_change, daemon=True).start()
+        return out
+
+
+class SdlSink:
+    """Audio output through SDL, pulling blocks from the engine in its callback"""
+
+    def __init__(self, engine, block_frames=BLOCK_FRAMES, extra_latency_frames=0):
+        from pygame._sdl2 import audio as sdl_audio
+        from pygame._sdl2 import sdl2
+
+        sdl2.init_subsystem(sdl2.INIT_AUDIO)
+        names = sdl_audio.get_audio_device_names(False)
+        self.engine = engine
+        self.device = sdl_audio.AudioDevice(
+            devicename=names[0] if names else "",
+            iscapture=False,
+            frequency=engine.rate,
+            audioformat=sdl_audio.AUDIO_F32,
+            numchannels=engine.channels,
+            chunksize=block_frames,
+            allowed_changes=0,
+            callback=self._callback
+        )
+        # O bloco entregue toca depois do que já está no buffer do dispositivo
+        engine.clock.latency_frames = block_frames + extra_latency_frames
+
+    def _callback(self, device, buffer):
+        frames = len(buffer) // (4 * self.engine.channels)
+        block = self.engine.render(frames)
+        np.asarray(buffer)[:] = block.view(np.uint8).ravel()
+
+    def start(self):
+        self.device.pause(0)
+
+    def close(self):
+        self.device.close()
+
+
+class FakeSink:
+    """Simulated output that consumes blocks without a sound card"""
+
+    def __init__(self, engine, block_frames=BLOCK_FRAMES, latency_frames=0):
+        self.engine = engine
+        self.block_frames = block_frames
+        engine.clock.latency_frames = latency_frames
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+    def pull(self, frames=None):
+        """Consume one block as the device would"""
+        return self.engine.render(frames or self.block_frames)
+
+    def run(self, seconds):
+        """Consume the given amount of audio as fast as possible"""
+        remaining = int(seconds * self.engine.rate)
+        while remaining > 0:
+            frames = min(self.block_frames, remaining)
+            self.pull(frames)
+            remaining -= frames
+
+
+def simulate_drift(hours=1.0, latency_frames=2048, seed=0):
+    """Play an hour of synthetic tracks with seeks, pauses, gapless changes and
+    decodes slower than playback, and return the worst clock error in milliseconds"""
+    rate = resampler.OUTPUT_RATE
+    rng = np.random.default_rng(seed)
+    engine = PlaybackEngine(rate=rate, channels=1)
+    sink = FakeSink(engine, latency_frames=latency_frames)
+    # Faixas ainda "decodificando": [faixa, PCM completo, velocidade, frames devidos]
+    filling = []
+
+    def make_track():
+        # Cada amostra guarda o número do frame + 1 (exato em float32 até 2**24)
+        frames = int(rng.integers(60, 300) * rate)
+        samples = np.arange(1, frames + 1, dtype=np.float32)[:, None]
+        if rng.random() < 0.5:
+            return decoder.DecodedTrack.from_pcm(samples, rate)
+        # Parte das faixas é preenchida aos poucos, às vezes mais devagar que a
+        # reprodução: cobre as marcas de falta de dados do relógio
+        track = decoder.DecodedTrack(rate=rate)
+        track.data = np.zeros_like(samples)
+        track.length = frames
+        # Como no player: a faixa só entra com o primeiro bloco pronto
+        track._append(samples[:rate])
+        filling.append([track, samples, rng.uniform(0.05, 1.2), 0.0])
+        return track
+
+    def decode_step():
+        # Como _decode_wav: blocos de STREAM_SECONDS, no ritmo de cada faixa
+        chunk = int(decoder.STREAM_SECONDS * rate)
+        for entry in list(filling):
+            track, samples, speed, due = entry
+            entry[3] = due = due + speed * BLOCK_FRAMES
+            if due >= chunk:
+                entry[3] -= chunk
+                track._append(samples[track.available:track.available + chunk])
+            if track.available == track.length:
+                track._done.set()
+                filling.remove(entry)
+
+    engine.on_track_end = None
+    engine.load_track(make_track())
+    engine.play()
+
+    history = deque()
+    history_frames = 0
+    last_count = 0
+    worst = 0
+    total = int(hours * 3600 * rate)
+    while engine.clock.consumed < total:
+        action = rng.random()
+        if action < 0.002 and engine.is_playing:
+            # Dentro do que já foi decodificado: depois de um salto para além
+            # dele o relógio fica no alvo antes de qualquer frame ser ouvido
+            engine.seek(rng.uniform(0, max(engine.track.available - 1, 0)) / rate)
+        elif action < 0.004:
+            engine.pause() if engine.is_playing else engine.play()
+        if engine.queued is None:
+            engine.queue_next(make_track())
+        if not engine.is_playing and rng.random() < 0.05:
+            engine.play()
+
+        decode_step()
+        block = sink.pull()[:, 0]
+        history.append(block)
+        history_frames += len(block)
+        while history_frames - len(history[0]) > latency_frames:
+            history_frames -= len(history.popleft())
+
+        # O último elemento é a amostra saindo do alto-falante agora
+        if engine.clock.consumed > latency_frames:
+            heard = np.concatenate(history)[:history_frames - latency_frames + 1]
+            played = heard[:-1][heard[:-1] > 0]
+            if len(played):
+                last_count = int(played[-1])
+            # Em silêncio (pausa ou falta de dados) a posição fica no último frame tocado
+            expected = int(heard[-1]) - 1 if heard[-1] > 0 else last_count
+            error = abs(engine.clock.position_frames() - expected) / rate
+            worst = max(worst, error)
+    return worst * 1000
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    drift = simulate_drift()
+    print(f"Erro máximo do relógio em 1h simulada: {drift:.3f} ms ({time.perf_counter() - start:.1f}s)")
+    assert drift < 10, "Relógio de reprodução com deriva acima de 10 ms"
@@ -0,0 +1,307 @@
+# Impressão digital acústica para encontrar músicas duplicadas (mesmo conteúdo, outra codificação)
+
+# Import required libraries
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import decoder
+from silence import THRESHOLD_DB
+
+CACHE_PATH = Path.home() / ".music_player" / "fingerprints.sqlite"
+
+# Análise: início da faixa, mono, taxa reduzida
+ANALYSIS_SECONDS = 30
+ANALYSIS_RATE = 11025
+FRAME_SIZE = 2048
+HOP_SIZE = 1024
+MIN_FREQ = 80
+MAX_FREQ = 5000
+
+# Hash resumido: blocos de tempo -> SimHash de 64 bits dividido em faixas para o índice
+TIME_BLOCKS = 8
+HASH_BITS = 64
+BANDS = 4
+# Taxa de bits diferentes abaixo da qual duas faixas são a mesma música
+MAX_BIT_ERROR_RATE = 0.25
+MAX_SHIFT_FRAMES = 2
+# Frames com som exigidos para comparar: faixas (quase) mudas no trecho
+# analisado não viram duplicadas umas das outras (~5 s)
+MIN_SOUND_FRAMES = 50
+# Muda quando o cálculo muda: impressões antigas do cache são descartadas
+CACHE_VERSION = 2
+
+
+def _chroma_matrix():
+    """Map FFT bins to the 12 pitch classes"""
+    freqs = np.fft.rfftfreq(FRAME_SIZE, 1 / ANALYSIS_RATE)
+    matrix = np.zeros((len(freqs), 12), dtype=np.float32)
+    valid = (freqs >= MIN_FREQ) & (freqs <= MAX_FREQ)
+    pitch = np.round(12 * np.log2(freqs[valid] / 440)).astype(int) % 12
+    matrix[np.flatnonzero(valid), pitch] = 1
+    return matrix
+
+
+CHROMA = _chroma_matrix()
+WINDOW = np.hanning(FRAME_SIZE).astype(np.float32)
+# Hiperplanos fixos: o mesmo SimHash em todos os processos e execuções
+PLANES = np.random.default_rng(1234).standard_normal((TIME_BLOCKS * 12, HASH_BITS)).astype(np.float32)
+
+
+def compute_chroma(samples):
+    """Normalized 12-bin chroma per frame (windowed FFTs), silent frames left out"""
+    samples = np.asarray(samples, dtype=np.float32).ravel()
+    if len(samples) < FRAME_SIZE + HOP_SIZE:
+        return np.zeros((0, 12), dtype=np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME_SIZE)[::HOP_SIZE]
+    # Silêncio digital daria chroma zerado, igual em qualquer faixa
+    power = np.square(frames).mean(axis=1)
+    frames = frames[power > 10 ** (THRESHOLD_DB / 10)]
+    spectrum = np.abs(np.fft.rfft(frames * WINDOW, axis=1)) ** 2
+    chroma = spectrum @ CHROMA
+    return chroma / (chroma.sum(axis=1, keepdims=True) + 1e-9)
+
+
+def compute_codes(chroma):
+    """24-bit sub-fingerprint per frame from chroma changes"""
+    if len(chroma) < 2:
+        return np.zeros(0, dtype=np.uint32)
+    # Bits: subiu em relação ao frame anterior? é maior que a nota vizinha?
+    rising = chroma[1:] > chroma[:-1]
+    neighbour = chroma[1:] > np.roll(chroma[1:], -1, axis=1)
+    bits = np.concatenate([rising, neighbour], axis=1)
+    weights = (1 << np.arange(24, dtype=np.uint32))
+    return (bits * weights).sum(axis=1).astype(np.uint32)
+
+
+def simhash(chroma):
+    """64-bit summary from the chroma profile of a few time blocks"""
+    if len(chroma) < TIME_BLOCKS:
+        return 0
+    blocks = np.array_split(chroma, TIME_BLOCKS)
+    # Perfil médio de cada bloco, centrado (estável entre codificações)
+    features = np.concatenate([b.mean(axis=0) for b in blocks]) - 1 / 12
+    signs = (features @ PLANES) > 0
+    return int(sum(1 << int(i) for i in np.flatnonzero(signs)))
+
+
+def bit_error_rate(a, b):
+    """Smallest fraction of differing bits over a few frame offsets"""
+    best = 1.0
+    for shift in range(-MAX_SHIFT_FRAMES, MAX_SHIFT_FRAMES + 1):
+        x = a[max(shift, 0):]
+        y = b[max(-shift, 0):]
+        n = min(len(x), len(y))
+        if n == 0:
+            continue
+        diff = np.bitwise_xor(x[:n], y[:n])
+        errors = np.unpackbits(diff.view(np.uint8)).sum()
+        best = min(best, errors / (n * 24))
+    return best
+
+
+def content_key(path):
+    """Cheap key for the file content: size plus hashes of the head and tail"""
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, "rb") as f:
+        digest.update(f.read(1024 * 1024))
+        if size > 1024 * 1024:
+            f.seek(-64 * 1024, os.SEEK_END)
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def fingerprint_file(path):
+    """Decode the start of a track and return (simhash, codes); codes are
+    empty when it has too little sound to be compared"""
+    samples = decoder.decode_file(
+        path,
+        rate=ANALYSIS_RATE,
+        channels=1,
+        quality="low",
+        max_seconds=ANALYSIS_SECONDS
+    )
+    chroma = compute_chroma(samples)
+    if len(chroma) < MIN_SOUND_FRAMES:
+        return 0, np.zeros(0, dtype=np.uint32)
+    return simhash(chroma), compute_codes(chroma)
+
+
+def _key_work(path):
+    try:
+        return path, content_key(path)
+    except OSError as e:
+        print(f"Erro ao ler {path}: {e}")
+        return path, None
+
+
+def _work(path):
+    try:
+        hashed, codes = fingerprint_file(path)
+        return path, hashed, codes.tobytes()
+    except Exception as e:
+        print(f"Erro ao analisar {path}: {e}")
+        return path, None, None
+
+
+class FingerprintCache:
+    """Fingerprints stored per file content in SQLite, plus the content key of
+    each path as of its size and modification time"""
+
+    def __init__(self, path=CACHE_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(path))
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != CACHE_VERSION:
+            self.db.execute("DROP TABLE IF EXISTS fingerprints")
+            self.db.execute("DROP TABLE IF EXISTS files")
+            self.db.execute(f"PRAGMA user_version = {CACHE_VERSION}")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints (key TEXT PRIMARY KEY, simhash INTEGER, codes BLOB)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, key TEXT)"
+        )
+
+    def key_for(self, path, size, mtime_ns):
+        """Content key of a path, if the file did not change since it was stored"""
+        row = self.db.execute(
+            "SELECT key FROM files WHERE path = ? AND size = ? AND mtime_ns = ?", (path, size, mtime_ns)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put_files(self, rows):
+        """Store (path, size, mtime_ns, key) rows"""
+        self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", rows)
+        self.db.commit()
+
+    def get(self, key):
+        row = self.db.execute("SELECT simhash, codes FROM fingerprints WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        # SQLite guarda inteiros com sinal: volta para 64 bits sem sinal
+        return row[0] & (2 ** 64 - 1), np.frombuffer(row[1], dtype=np.uint32)
+
+    def put_many(self, rows):
+        self.db.executemany(
+            "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?)",
+            [(key, hashed - 2 ** 64 if hashed >= 2 ** 63 else hashed, codes) for key, hashed, codes in rows]
+        )
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+class FingerprintIndex:
+    """Near-duplicate lookup by SimHash bands (pigeonhole on Hamming distance)"""
+
+    def __init__(self):
+        self.entries = []
+        self.bands = [{} for _ in range(BANDS)]
+
+    @staticmethod
+    def _band_values(hashed):
+        width = HASH_BITS // BANDS
+        return [(hashed >> (i * width)) & ((1 << width) - 1) for i in range(BANDS)]
+
+    def add(self, item, hashed, codes):
+        """Index an item and return the earlier items it duplicates"""
+        matches = []
+        candidates = set()
+        for band, value in zip(self.bands, self._band_values(hashed)):
+            candidates.update(band.get(value, ()))
+        for entry in sorted(candidates):
+            other, _, other_codes = self.entries[entry]
+            if bit_error_rate(codes, other_codes) < MAX_BIT_ERROR_RATE:
+                matches.append(other)
+
+        entry = len(self.entries)
+        self.entries.append((item, hashed, codes))
+        for band, value in zip(self.bands, self._band_values(hashed)):
+            band.setdefault(value, []).append(entry)
+        return matches
+
+
+def find_duplicates(paths, workers=None, cache_path=CACHE_PATH):
+    """Group paths that hold the same recording; returns {kept path: [duplicates]}"""
+    paths = list(dict.fromkeys(paths))
+    cache = FingerprintCache(cache_path)
+    fingerprints = {}
+    stats = {}
+    unknown = []
+    # Arquivo sem mudança de tamanho e data: chave do cache, sem ler o conteúdo
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        stats[path] = (st.st_size, st.st_mtime_ns)
+        key = cache.key_for(path, *stats[path])
+        cached = cache.get(key) if key else None
+        if cached:
+            fingerprints[path] = cached
+        else:
+            unknown.append(path)
+
+    # O resto em paralelo: chave do conteúdo (um arquivo renomeado continua no
+    # cache) e, só para conteúdo novo, a decodificação
+    if unknown:
+        files = []
+        rows = []
+        # spawn + driver dummy: os processos decodificam sem abrir a placa de som
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=decoder.init_worker) as pool:
+            keys = {}
+            missing = []
+            for path, key in pool.map(_key_work, unknown, chunksize=16):
+                if key is None:
+                    continue
+                keys[path] = key
+                files.append((path, *stats[path], key))
+                cached = cache.get(key)
+                if cached:
+                    fingerprints[path] = cached
+                else:
+                    missing.append(path)
+            for path, hashed, codes in pool.map(_work, missing, chunksize=16):
+                if hashed is None:
+                    continue
+                fingerprints[path] = (hashed, np.frombuffer(codes, dtype=np.uint32))
+                rows.append((keys[path], hashed, codes))
+        cache.put_many(rows)
+        cache.put_files(files)
+    cache.close()
+
+    index = FingerprintIndex()
+    groups = {}
+    kept = {}
+    for path in paths:
+        if path not in fingerprints:
+            continue
+        hashed, codes = fingerprints[path]
+        if len(codes) == 0:
+            continue
+        matches = index.add(path, hashed, codes)
+        if matches:
+            # Fica a primeira ocorrência na ordem da playlist
+            first = kept.get(matches[0], matches[0])
+            kept[path] = first
+            groups.setdefault(first, []).append(path)
+    return groups
+
+
+if __name__ == "__main__":
+    # Uso: python fingerprint.py <pasta>
+    root = Path(sys.argv[1] if len(sys.argv) > 1 else ".")
+    files = [str(p) for p in root.rglob("*") if p.suffix.lower() in (".mp3", ".wav")]
+    for kept, duplicates in find_duplicates(files).items():
+        print(kept)
+        for path in duplicates:
+            print(f"    = {path}")
@@ -0,0 +1,301 @@
+# Histórico de reprodução: log binário só de acréscimo e índices agregados em memória
+
+# Import required libraries
+import os
+import random
+import sys
+import threading
+import time
+from itertools import compress, repeat
+from pathlib import Path
+
+import numpy as np
+
+HISTORY_PATH = Path.home() / ".music_player" / "history.bin"
+
+# Registro fixo: id da faixa, início (epoch), ms tocados, terminou (1) ou pulou (0)
+RECORD = np.dtype([("track", "<u4"), ("start", "<f8"), ("ms", "<u4"), ("completed", "u1")])
+# Faixas tocadas nas últimas 24 h perdem peso no modo aleatório ponderado
+RECENT_SECONDS = 24 * 3600
+RECENT_FACTOR = 0.25
+MIN_WEIGHT = 0.05
+MAX_WEIGHT = 10.0
+EMPTY_MONTH = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+
+def month_of(timestamps):
+    """Month number (months since 1970, UTC) of epoch timestamps"""
+    seconds = np.asarray(timestamps, dtype=np.float64).astype("datetime64[s]")
+    return seconds.astype("datetime64[M]").astype(np.int64)
+
+
+class HistoryIndex:
+    """Per-track rollups (plays, skips, time, last play, plays per month)"""
+
+    def __init__(self):
+        self.plays = np.zeros(0, dtype=np.int64)
+        self.skips = np.zeros(0, dtype=np.int64)
+        self.ms_played = np.zeros(0, dtype=np.int64)
+        self.last_played = np.zeros(0, dtype=np.float64)
+        # {mês: (faixas tocadas no mês, em ordem, plays completos de cada uma)}:
+        # esparso, cada mês só guarda as faixas que tocaram nele
+        self.monthly = {}
+
+    def _grow(self, size):
+        if size <= len(self.plays):
+            return
+        # Crescimento geométrico: acréscimos um a um continuam baratos
+        size = max(size, 2 * len(self.plays), 1024)
+        for name in ("plays", "skips", "ms_played", "last_played"):
+            array = getattr(self, name)
+            grown = np.zeros(size, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def add_records(self, records):
+        """Fold a batch of records into the rollups (vectorized)"""
+        if len(records) == 0:
+            return
+        tracks = records["track"].astype(np.int64)
+        size = int(tracks.max()) + 1
+        self._grow(size)
+        n = len(self.plays)
+        completed = records["completed"].astype(bool)
+        self.plays += np.bincount(tracks[completed], minlength=n)
+        self.skips += np.bincount(tracks[~completed], minlength=n)
+        self.ms_played += np.bincount(tracks, weights=records["ms"], minlength=n).astype(np.int64)
+        np.maximum.at(self.last_played, tracks, records["start"])
+
+        # Pares (mês, faixa) distintos do lote numa só ordenação (só faixas ouvidas até o fim)
+        keys = (month_of(records["start"][completed]) << 32) | tracks[completed]
+        keys, counts = np.unique(keys, return_counts=True)
+        if len(keys) == 0:
+            return
+        months = keys >> 32
+        bounds = np.flatnonzero(np.diff(months)) + 1
+        for month_keys, month_counts in zip(np.split(keys, bounds), np.split(counts, bounds)):
+            month = int(month_keys[0] >> 32)
+            month_tracks = month_keys & 0xFFFFFFFF
+            if month in self.monthly:
+                old_tracks, old_counts = self.monthly[month]
+                month_tracks, inverse = np.unique(np.concatenate([old_tracks, month_tracks]), return_inverse=True)
+                month_counts = np.bincount(inverse, weights=np.concatenate([old_counts, month_counts])).astype(np.int64)
+            self.monthly[month] = (month_tracks, month_counts.astype(np.int64))
+
+    def add(self, track, start, ms, completed):
+        """Fold one event in (scalar updates, no full-array passes)"""
+        self._grow(track + 1)
+        if completed:
+            self.plays[track] += 1
+        else:
+            self.skips[track] += 1
+        self.ms_played[track] += ms
+        self.last_played[track] = max(self.last_played[track], start)
+        if not completed:
+            return
+        month = int(month_of(start))
+        tracks, counts = self.monthly.get(month, EMPTY_MONTH)
+        i = int(np.searchsorted(tracks, track))
+        if i < len(tracks) and tracks[i] == track:
+            counts[i] += 1
+        else:
+            self.monthly[month] = (np.insert(tracks, i, track), np.insert(counts, i, 1))
+
+
+class HistoryLog:
+    """Appends play events from a background thread; queries answer from the rollups"""
+
+    def __init__(self, path=HISTORY_PATH):
+        self.path = Path(path)
+        # Caminhos das faixas, um por linha: o número da linha é o id
+        self.tracks_path = self.path.with_suffix(".tracks")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.index = HistoryIndex()
+        self.paths = []
+        self.ids = {}
+        self._load()
+
+        self._pending = []
+        self._new_paths = []
+        self._closed = False
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _load(self):
+        # Uma queda no meio da escrita deixa um caminho ou registro incompleto no
+        # fim: é cortado também no arquivo, senão o próximo acréscimo emendaria nele
+        if self.tracks_path.exists():
+            text = self.tracks_path.read_bytes()
+            complete = text.rfind(b"\n") + 1
+            if complete < len(text):
+                os.truncate(self.tracks_path, complete)
+            self.paths = text[:complete].decode("utf-8").split("\n")[:-1]
+            self.ids = {path: i for i, path in enumerate(self.paths)}
+        if self.path.exists():
+            data = self.path.read_bytes()
+            usable = len(data) - len(data) % RECORD.itemsize
+            records = np.frombuffer(data[:usable], dtype=RECORD)
+            valid = records["track"] < len(self.paths)
+            if not valid.all():
+                # Registros de caminhos perdidos: o id vai para a próxima faixa nova
+                records = records[valid]
+                temp = self.path.with_suffix(".tmp")
+                temp.write_bytes(records.tobytes())
+                os.replace(temp, self.path)
+            elif usable < len(data):
+                os.truncate(self.path, usable)
+            self.index.add_records(records)
+
+    def record(self, path, start, ms, completed):
+        """Log a play event; returns immediately (the write happens in the background)"""
+        with self._condition:
+            track = self.ids.get(path)
+            if track is None:
+                track = self.ids[path] = len(self.paths)
+                self.paths.append(path)
+                self._new_paths.append(path)
+            self.index.add(track, start, ms, completed)
+            self._pending.append((track, start, ms, completed))
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                pending, self._pending = self._pending, []
+                new_paths, self._new_paths = self._new_paths, []
+                closed = self._closed
+            try:
+                self._write(pending, new_paths)
+            except OSError as e:
+                print(f"Erro ao gravar histórico: {e}")
+            if closed:
+                return
+
+    def _write(self, pending, new_paths):
+        if new_paths:
+            # Os caminhos vão antes dos eventos que apontam para eles
+            with open(self.tracks_path, "a", encoding="utf-8") as f:
+                f.write("".join(path + "\n" for path in new_paths))
+        if pending:
+            with open(self.path, "ab") as f:
+                f.write(np.array(pending, dtype=RECORD).tobytes())
+
+    # Consultas
+
+    def _ids(self, paths):
+        """Track ids of paths; unknown paths map to one past the last rollup entry"""
+        n = len(self.index.plays)
+        ids = np.fromiter(map(self.ids.get, paths, repeat(n)), dtype=np.int64, count=len(paths))
+        return np.minimum(ids, n)
+
+    def most_played(self, limit=10, month=None):
+        """[(path, plays)] of the most played tracks, in a month (months since
+        1970, see month_of) or over all time"""
+        with self._lock:
+            if month is None:
+                counts = self.index.plays[:len(self.paths)]
+                ids = np.arange(len(counts))
+            else:
+                ids, counts = self.index.monthly.get(month, EMPTY_MONTH)
+            limit = min(limit, int(np.count_nonzero(counts)))
+            if limit == 0:
+                return []
+            top = np.argpartition(counts, -limit)[-limit:]
+            top = top[np.argsort(counts[top])[::-1]]
+            return [(self.paths[ids[i]], int(counts[i])) for i in top]
+
+    def most_played_this_month(self, limit=10):
+        return self.most_played(limit, int(month_of(time.time())))
+
+    def never_played(self, paths):
+        """Paths from the given library with no play event at all"""
+        with self._lock:
+            last = np.append(self.index.last_played, 0.0)[self._ids(paths)]
+        return list(compress(paths, last == 0))
+
+    def last_played(self, path):
+        """Epoch of the last play of a track, or None"""
+        with self._lock:
+            i = self.ids.get(path)
+            if i is None or i >= len(self.index.last_played) or self.index.last_played[i] == 0:
+                return None
+            return float(self.index.last_played[i])
+
+    def stats(self, paths):
+        """Arrays of plays, skips and last play for the given paths (zero if unknown)"""
+        with self._lock:
+            ids = self._ids(paths)
+            return {
+                "plays": np.append(self.index.plays, 0)[ids],
+                "skips": np.append(self.index.skips, 0)[ids],
+                "last_played": np.append(self.index.last_played, 0.0)[ids],
+            }
+
+    def weights(self, paths, now=None):
+        """Shuffle weights: favour tracks played to the end, avoid skipped and recent ones"""
+        now = time.time() if now is None else now
+        # Faixas sem histórico ficam com peso neutro
+        stats = self.stats(paths)
+        plays, skips, last = stats["plays"], stats["skips"], stats["last_played"]
+        weights = (1 + plays) / (1 + 2 * skips)
+        weights = np.where(now - last < RECENT_SECONDS, weights * RECENT_FACTOR, weights)
+        return np.clip(weights, MIN_WEIGHT, MAX_WEIGHT).tolist()
+
+
+def benchmark(events=2_000_000, tracks=200_000):
+    """Load a log with millions of events and time the queries"""
+    import tempfile
+
+    rng = np.random.default_rng(0)
+    folder = Path(tempfile.mkdtemp())
+    paths = [f"C:/Users/music/Album {i // 12}/{i % 12:02d} - Faixa {i}.mp3" for i in range(tracks)]
+    (folder / "history.tracks").write_text("".join(p + "\n" for p in paths), encoding="utf-8")
+    records = np.zeros(events, dtype=RECORD)
+    # Popularidade desigual, como numa biblioteca real
+    records["track"] = np.minimum(rng.zipf(1.3, events) - 1, tracks - 1)
+    records["start"] = np.sort(time.time() - rng.uniform(0, 3 * 365 * 86400, events))
+    records["ms"] = rng.integers(1000, 300000, events)
+    records["completed"] = rng.random(events) < 0.7
+    records.tofile(folder / "history.bin")
+
+    start = time.perf_counter()
+    log = HistoryLog(folder / "history.bin")
+    print(f"Carregar {events} eventos: {(time.perf_counter() - start) * 1000:.0f} ms")
+    monthly_bytes = sum(t.nbytes + c.nbytes for t, c in log.index.monthly.values())
+    print(f"Contagens mensais: {len(log.index.monthly)} meses, {monthly_bytes / 1024 / 1024:.1f} MiB")
+    for name, query in [
+        ("Mais tocadas no mês", lambda: log.most_played_this_month(10)),
+        ("Mais tocadas (total)", lambda: log.most_played(10)),
+        ("Nunca tocadas", lambda: log.never_played(paths)),
+        ("Pesos do aleatório", lambda: log.weights(paths)),
+    ]:
+        start = time.perf_counter()
+        query()
+        print(f"{name}: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        log.record(random.choice(paths), time.time(), 180000, True)
+    print(f"1000 registros (sem esperar o disco): {(time.perf_counter() - start) * 1000:.1f} ms")
+    log.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # Uso: python history.py <history.bin> -> as mais tocadas
+        log = HistoryLog(sys.argv[1])
+        for path, plays in log.most_played(20):
+            print(f"{plays:6d}  {os.path.basename(path)}")
+        log.close()
+    else:
+        benchmark()
@@ -0,0 +1,67 @@
+# Cache de metadados por faixa (duração, silêncio no início/fim, volume médio) em SQLite
+
+# Import required libraries
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+METADATA_PATH = Path.home() / ".music_player" / "metadata.sqlite"
+
+FIELDS = ("duration", "lead", "tail", "loudness")
+
+
+class MetadataCache:
+    """Per-file analysis results, invalidated when the file size or mtime changes"""
+
+    def __init__(self, path=METADATA_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Usado pela thread de análise e pela do controlador
+        self.db = sqlite3.connect(str(path), check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS tracks (path TEXT PRIMARY KEY, size INTEGER, mtime REAL, "
+            "duration REAL, lead REAL, tail REAL, loudness REAL)"
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stamp(path):
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime
+
+    def get(self, path):
+        """Cached fields of a file, or None if missing or stale"""
+        try:
+            stamp = self._stamp(path)
+        except OSError:
+            return None
+        with self._lock:
+            row = self.db.execute(
+                "SELECT size, mtime, duration, lead, tail, loudness FROM tracks WHERE path = ?", (path,)
+            ).fetchone()
+        if row is None or tuple(row[:2]) != stamp:
+            return None
+        return dict(zip(FIELDS, row[2:]))
+
+    def get_many(self, paths):
+        """{path: fields} for the paths with a valid entry"""
+        return {path: fields for path in paths if (fields := self.get(path))}
+
+    def items(self):
+        """Every cached entry as {path: fields}, without checking the files"""
+        with self._lock:
+            rows = self.db.execute("SELECT path, duration, lead, tail, loudness FROM tracks").fetchall()
+        return {row[0]: dict(zip(FIELDS, row[1:])) for row in rows}
+
+    def put(self, path, fields):
+        size, mtime = self._stamp(path)
+        with self._lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, size, mtime) + tuple(fields[name] for name in FIELDS)
+            )
+            self.db.commit()
+
+    def close(self):
+        with self._lock:
+            self.db.close()
@@ -0,0 +1,166 @@
+# Fila de reprodução: playlist e ordem de execução (sequencial ou embaralhada)
+
+# Import required libraries
+import random
+
+
+class PlayQueue:
+    """Playlist plus the order it is played in"""
+
+    def __init__(self, tracks=(), shuffle=False):
+        self.tracks = list(tracks)
+        self.shuffle = shuffle
+        # Pesos do modo aleatório ponderado (um por faixa), None para uniforme
+        self.weights = None
+        self.order = list(range(len(self.tracks)))
+        self.position = 0
+        # Muda a cada alteração de faixas ou ordem (não de posição)
+        self.version = 0
+        if shuffle:
+            self._shuffle_order()
+
+    def __len__(self):
+        return len(self.tracks)
+
+    @property
+    def current_index(self):
+        """Index of the current track in the playlist"""
+        if not self.tracks:
+            return 0
+        return self.order[self.position]
+
+    @property
+    def current_track(self):
+        if not self.tracks:
+            return None
+        return self.tracks[self.current_index]
+
+    def set_tracks(self, tracks):
+        """Replace the playlist and rewind"""
+        self.version += 1
+        self.tracks = list(tracks)
+        self.weights = None
+        self.order = list(range(len(self.tracks)))
+        self.position = 0
+        if self.shuffle:
+            self._shuffle_order()
+
+    def restore(self, tracks, order, position, shuffle):
+        """Restore a saved playlist and play order as is"""
+        self.version += 1
+        self.tracks = list(tracks)
+        self.shuffle = shuffle
+        self.weights = None
+        if sorted(order) != list(range(len(self.tracks))):
+            # Ordem inconsistente com a playlist: volta para a sequencial
+            order = list(range(len(self.tracks)))
+        self.order = list(order)
+        self.position = min(position, max(len(self.order) - 1, 0))
+
+    def add_tracks(self, paths):
+        """Append new tracks at the end of the play order (known ones are skipped)"""
+        known = set(self.tracks)
+        new = [p for p in dict.fromkeys(paths) if p not in known]
+        if not new:
+            return
+        self.version += 1
+        start = len(self.tracks)
+        self.tracks.extend(new)
+        if self.weights is not None:
+            self.weights.extend([1.0] * len(new))
+        self.order.extend(range(start, start + len(new)))
+
+    def remove_tracks(self, paths):
+        """Remove tracks from the playlist, keeping the current one"""
+        paths = set(paths)
+        current = self.current_index
+        new_index = {}
+        tracks = []
+        for i, track in enumerate(self.tracks):
+            if track not in paths or i == current:
+                new_index[i] = len(tracks)
+                tracks.append(track)
+        if len(tracks) == len(self.tracks):
+            return
+        self.version += 1
+        if self.weights is not None:
+            self.weights = [self.weights[i] for i in new_index]
+        self.tracks = tracks
+        self.order = [new_index[i] for i in self.order if i in new_index]
+        self.position = self.order.index(new_index[current]) if tracks else 0
+
+    def set_shuffle(self, shuffle):
+        """Switch between sequential and shuffled order, keeping the current track"""
+        index = self.current_index
+        self.version += 1
+        self.shuffle = shuffle
+        self.order = list(range(len(self.tracks)))
+        if shuffle:
+            self._shuffle_order(first=index)
+            self.position = 0
+        else:
+            self.position = index
+
+    def set_weights(self, weights):
+        """Use per-track weights for shuffling (None for uniform) and reshuffle the rest"""
+        self.weights = list(weights) if weights is not None else None
+        if self.shuffle and self.tracks:
+            self.version += 1
+            played = self.order[:self.position + 1]
+            rest = self._weighted_order(self.order[self.position + 1:])
+            self.order = played + rest
+
+    def _weighted_order(self, indices):
+        if self.weights is None:
+            indices = list(indices)
+            random.shuffle(indices)
+            return indices
+        # Amostragem sem reposição: chave u^(1/peso), maiores primeiro
+        keys = {i: random.random() ** (1 / self.weights[i]) for i in indices}
+        return sorted(indices, key=keys.__getitem__, reverse=True)
+
+    def _shuffle_order(self, first=None):
+        self.version += 1
+        self.order = self._weighted_order(self.order)
+        if first is not None and self.order:
+            # A faixa atual continua tocando: fica no início da permutação
+            self.order.remove(first)
+            self.order.insert(0, first)
+
+    def next(self):
+        """Advance to the next track and return it"""
+        if not self.tracks:
+            return None
+        self.position += 1
+        if self.position >= len(self.order):
+            self.position = 0
+            if self.shuffle:
+                # Nova volta: nova permutação
+                self._shuffle_order()
+        return self.current_track
+
+    def peek_next(self):
+        """Track next() will return, or None while it is not decided yet
+        (the end of a shuffled round reshuffles)"""
+        if not self.tracks:
+            return None
+        if self.position + 1 < len(self.order):
+            return self.tracks[self.order[self.position + 1]]
+        if self.shuffle:
+            return None
+        return self.tracks[self.order[0]]
+
+    def prev(self):
+        """Go back to the previous track and return it"""
+        if not self.tracks:
+            return None
+        self.position = (self.position - 1) % len(self.order)
+        return self.current_track
+
+    def upcoming(self, count):
+        """Paths of the next tracks in play order (wrapping around)"""
+        if not self.tracks:
+            return []
+        count = min(count, len(self.order) - 1)
+        positions = ((self.position + i) % len(self.order) for i in range(1, count + 1))
+        return [self.tracks[self.order[p]] for p in positions]
@@ -2,12 +2,12 @@
 
 # Import required libraries
 import flet as ft
-from playsound import playsound
-import os
+import atexit
 from pathlib import Path
-import random
-import threading
-import time
+import control_api
+from controller import get_controller
+from equalizer import PRESETS
+from visualizer import BANDS, level_fraction
 
 def main(page: ft.Page):
     page.title = "Music Player"
@@ -19,24 +19,8 @@ def main(page: ft.Page):
     page.window_bgcolor = ft.Colors.TRANSPARENT  # Atualizado para Colors
     page.window_border_radius = 10
     
-    # Variáveis de estado do player
-    current_track = None
-    is_playing = False
-    is_muted = False
-    is_loop = False
-    is_random = False
-    playlist = []
-    current_index = 0
-    current_position = 0
-    track_duration = 0  # Estimativa
-    last_volume = 100
-    
-    # Estado do player
-    play_thread = None
-    start_time = 0
-    is_stopped = False
-    track_ended = False
-    timer = None
+    # Estado compartilhado: um único motor para todas as sessões abertas
+    player = get_controller()
     
     # File picker
     file_picker = ft.FilePicker()
@@ -133,6 +117,66 @@ def main(page: ft.Page):
         )
         art_container.border_radius = 10
     
+    # Visualizador (espectro + medidor de pico), no lugar da capa quando ativo
+    visualizer_shown = False
+    spectrum_bars = [
+        ft.Container(width=14, height=0, bgcolor=ft.Colors.GREEN_400, border_radius=2)
+        for _ in range(BANDS)
+    ]
+    peak_meter = ft.ProgressBar(width=300, value=0, color=ft.Colors.GREEN_400)
+    visualizer_view = ft.Container(
+        content=ft.Column(
+            controls=[
+                ft.Row(
+                    controls=spectrum_bars,
+                    alignment=ft.MainAxisAlignment.CENTER,
+                    vertical_alignment=ft.CrossAxisAlignment.END,
+                    height=190,
+                    spacing=4
+                ),
+                peak_meter
+            ],
+            horizontal_alignment=ft.CrossAxisAlignment.CENTER
+        ),
+        width=300,
+        height=225,
+        bgcolor=ft.Colors.GREY_800,
+        border_radius=10,
+        visible=False
+    )
+    
+    visualizer_btn = ft.IconButton(
+        icon=ft.Icons.BAR_CHART,
+        icon_color=ft.Colors.WHITE,
+        tooltip="Visualizador"
+    )
+    
+    # Presets do equalizador
+    eq_menu = ft.PopupMenuButton(
+        icon=ft.Icons.EQUALIZER,
+        icon_color=ft.Colors.WHITE,
+        tooltip="Equalizador",
+        items=[
+            ft.PopupMenuItem(text=name, on_click=lambda _, name=name: player.set_eq_preset(name))
+            for name in PRESETS
+        ]
+    )
+    
+    # Pular silêncio no início e no fim das faixas
+    silence_btn = ft.IconButton(
+        icon=ft.Icons.CONTENT_CUT,
+        icon_color=ft.Colors.WHITE,
+        tooltip="Pular silêncio"
+    )
+    
+    # Playlists inteligentes (definidas pela API local; aqui só tocar)
+    smart_menu = ft.PopupMenuButton(
+        icon=ft.Icons.PLAYLIST_PLAY,
+        icon_color=ft.Colors.WHITE,
+        tooltip="Playlists inteligentes",
+        items=[]
+    )
+    
     # Funções do player
     def format_time(seconds):
         """Format seconds to MM:SS format"""
@@ -140,245 +184,97 @@ def main(page: ft.Page):
         seconds = int(seconds % 60)
         return f"{minutes}:{seconds:02d}"
     
-    def update_progress():
-        """Update progress bar and time counter"""
-        nonlocal current_position
+    def on_state(delta):
+        """Apply a state delta from the shared player to this page"""
+        if "title" in delta and delta["title"]:
+            header.value = delta["title"]
+        if "is_playing" in delta:
+            play_btn.icon = ft.Icons.PAUSE if delta["is_playing"] else ft.Icons.PLAY_ARROW  # Atualizado para Icons
+        if "is_loop" in delta:
+            loop_btn.bgcolor = ft.Colors.GREY_600 if delta["is_loop"] else ft.Colors.GREY_800  # Atualizado para Colors
+        if "is_random" in delta:
+            random_btn.bgcolor = ft.Colors.GREY_600 if delta["is_random"] else ft.Colors.GREY_800  # Atualizado para Colors
+        if "is_muted" in delta:
+            mute_btn.icon = ft.Icons.VOLUME_OFF if delta["is_muted"] else ft.Icons.VOLUME_UP  # Atualizado para Icons
+        if "skip_silence" in delta:
+            silence_btn.icon_color = ft.Colors.WHITE if delta["skip_silence"] else ft.Colors.GREY_600
+        if "smart_playlists" in delta:
+            smart_menu.items = [
+                ft.PopupMenuItem(text=f"{name} ({count})", on_click=lambda _, name=name: player.play_smart_playlist(name))
+                for name, count in delta["smart_playlists"].items()
+            ]
+        if "volume" in delta:
+            volume_slider.value = delta["volume"]
+        if delta.get("meter") and visualizer_shown:
+            meter = delta["meter"]
+            for bar, level in zip(spectrum_bars, meter["spectrum"]):
+                bar.height = 2 + level * 180
+            peak_meter.value = level_fraction(meter["peak"])
+        if "position" in delta or "duration" in delta:
+            # Update progress bar and time counter
+            if player.track_duration > 0:
+                progress.value = min(player.current_position / player.track_duration, 1.0)
+                time_counter.value = f"{format_time(player.current_position)} / {format_time(player.track_duration)}"
+            else:
+                progress.value = 0
+                time_counter.value = "0:00 / 0:00"
         
-        if is_playing and not is_stopped:
-            # Calcular a posição atual com base no tempo
-            current_position = min(time.time() - start_time, track_duration)
-            
-            # Update progress bar
-            if track_duration > 0:
-                progress_value = min(current_position / track_duration, 1.0)
-                progress.value = progress_value
-                
-                # Update time counter
-                time_text = f"{format_time(current_position)} / {format_time(track_duration)}"
-                time_counter.value = time_text
-                
-                # Update UI
-                page.update()
-                
-                # Schedule next update
-                return True
-        return False
-    
-    def start_progress_timer():
-        """Start timer to update progress"""
-        nonlocal timer
-        
-        if timer:
-            stop_progress_timer()
-        
-        def timer_func():
-            nonlocal timer
-            if update_progress():
-                # Se update_progress retornar True, agendar próxima execução
-                timer = threading.Timer(0.1, timer_func)
-                timer.daemon = True
-                timer.start()
-        
-        # Iniciar o timer
-        timer = threading.Timer(0.1, timer_func)
-        timer.daemon = True
-        timer.start()
-    
-    def stop_progress_timer():
-        """Stop progress timer"""
-        nonlocal timer
-        if timer:
-            timer.cancel()
-            timer = None
-    
-    def play_sound_thread(track_path):
-        """Função para reproduzir o som em uma thread separada"""
-        nonlocal is_stopped, track_ended, is_playing
-        
-        try:
-            playsound(track_path, block=True)
-            # Se chegou aqui e não foi parado, a música terminou naturalmente
-            if not is_stopped and is_playing:
-                track_ended = True
-                # Handle track end
-                page.invoke_async(handle_track_end)
-        except Exception as e:
-            print(f"Erro ao reproduzir: {e}")
-    
-    def handle_track_end():
-        """Handle track end event"""
-        if is_loop:
-            play_current_track()
-        else:
-            next_track(None)
+        # Update UI
+        page.update()
     
     def on_file_picker_result(e):
-        nonlocal playlist, current_index, current_track
-        
         if e.files:
-            # Clear current playlist
-            playlist = []
-            
             # Add only MP3 and WAV files to playlist
+            playlist = []
             for f in e.files:
                 file_ext = Path(f.path).suffix.lower()[1:]
                 if file_ext in supported_formats:
                     playlist.append(f.path)
             
             # Update UI if files were added
-            if playlist:
-                current_index = 0
-                current_track = playlist[current_index]
-                header.value = os.path.basename(current_track)
-                page.update()
-    
-    def load_track(e=None):
-        nonlocal current_track
-        
+            player.set_tracks(playlist)
+    
+    def play_pause(e):
         # If no files have been selected, show file picker
-        if not playlist:
+        if not player.current_track:
             file_picker.pick_files(
                 allow_multiple=True,
                 allowed_extensions=supported_formats
             )
-        elif playlist:
-            current_track = playlist[current_index]
-    
-    def play_pause(e):
-        nonlocal is_playing, is_stopped, play_thread, start_time
-        
-        if not current_track:
-            load_track()
-            if not current_track:
-                return
-            play_current_track()
             return
-        
-        if is_playing:
-            # Pause playback - com playsound temos que parar completamente
-            is_playing = False
-            is_stopped = True
-            play_btn.icon = ft.Icons.PLAY_ARROW  # Atualizado para Icons
-            stop_progress_timer()
-        else:
-            # Resume playback - com playsound temos que reiniciar
-            play_current_track()
-        
-        page.update()
-    
-    def stop(e):
-        nonlocal is_playing, is_stopped
-        
-        # Stop playback
-        is_playing = False
-        is_stopped = True
-        play_btn.icon = ft.Icons.PLAY_ARROW  # Atualizado para Icons
-        stop_progress_timer()
-        
-        # Reset progress bar and time counter
-        progress.value = 0
-        time_counter.value = "0:00 / 0:00"
-        page.update()
-    
-    def prev_track(e):
-        nonlocal current_index, current_track
-        
-        if not playlist:
-            return
-            
-        if is_random:
-            current_index = random.randint(0, len(playlist) - 1)
-        else:
-            current_index = (current_index - 1) % len(playlist)
-        current_track = playlist[current_index]
-        play_current_track()
-    
-    def next_track(e):
-        nonlocal current_index, current_track
-        
-        if not playlist:
-            return
-            
-        if is_random:
-            current_index = random.randint(0, len(playlist) - 1)
+        player.play_pause()
+    
+    def toggle_visualizer(e):
+        nonlocal visualizer_shown
+        visualizer_shown = not visualizer_shown
+        # Escondido, o motor nem chama o analisador
+        if visualizer_shown:
+            player.show_visualizer()
         else:
-            current_index = (current_index + 1) % len(playlist)
-        current_track = playlist[current_index]
-        play_current_track()
-    
-    def play_current_track():
-        nonlocal is_stopped, is_playing, track_ended, start_time, play_thread, track_duration
-        
-        # Parar qualquer reprodução atual
-        is_stopped = True
-        if play_thread and play_thread.is_alive():
-            # Aguardar a thread atual terminar
-            time.sleep(0.1)
-        
-        # Resetar estado
-        is_stopped = False 
-        is_playing = True
-        track_ended = False
-        
-        # Atualizar UI
-        play_btn.icon = ft.Icons.PAUSE  # Atualizado para Icons
-        header.value = os.path.basename(current_track)
-        
-        # Estimar a duração - playsound não fornece informações de duração
-        # Vamos usar uma estimativa padrão de 3 minutos
-        track_duration = 180  # 3 minutos em segundos
-        
-        # Iniciar reprodução em uma thread separada
-        start_time = time.time()
-        play_thread = threading.Thread(target=play_sound_thread, args=(current_track,))
-        play_thread.daemon = True
-        play_thread.start()
-        
-        # Iniciar timer para atualizar a barra de progresso
-        start_progress_timer()
+            player.hide_visualizer()
+        visualizer_view.visible = visualizer_shown
+        art_container.visible = not visualizer_shown
         page.update()
     
-    def toggle_loop(e):
-        nonlocal is_loop
-        is_loop = not is_loop
-        loop_btn.bgcolor = ft.Colors.GREY_600 if is_loop else ft.Colors.GREY_800  # Atualizado para Colors
-        page.update()
-    
-    def toggle_random(e):
-        nonlocal is_random
-        is_random = not is_random
-        random_btn.bgcolor = ft.Colors.GREY_600 if is_random else ft.Colors.GREY_800  # Atualizado para Colors
-        page.update()
-    
-    def set_volume(e):
-        # Playsound não suporta controle de volume
-        # Esta função agora é apenas visual
-        pass
-    
-    def toggle_mute(e):
-        nonlocal is_muted, last_volume
-        # Playsound não suporta controle de volume
-        # Esta função agora é apenas visual
-        is_muted = not is_muted
-        if is_muted:
-            last_volume = volume_slider.value
-            volume_slider.value = 0
-        else:
-            volume_slider.value = last_volume
-        
-        mute_btn.icon = ft.Icons.VOLUME_OFF if is_muted else ft.Icons.VOLUME_UP  # Atualizado para Icons
-        page.update()
+    def on_close(e):
+        # Sessão encerrada: parar de receber atualizações
+        unsubscribe()
+        if visualizer_shown:
+            player.hide_visualizer()
     
     # Configurar handlers para eventos
     file_picker.on_result = on_file_picker_result
     play_btn.on_click = play_pause
-    prev_btn.on_click = prev_track
-    next_btn.on_click = next_track
-    stop_btn.on_click = stop
-    loop_btn.on_click = toggle_loop
-    random_btn.on_click = toggle_random
-    volume_slider.on_change = set_volume
-    mute_btn.on_click = toggle_mute
+    prev_btn.on_click = lambda _: player.prev_track()
+    next_btn.on_click = lambda _: player.next_track()
+    stop_btn.on_click = lambda _: player.stop()
+    loop_btn.on_click = lambda _: player.toggle_loop()
+    random_btn.on_click = lambda _: player.toggle_random()
+    volume_slider.on_change = lambda e: player.set_volume(e.control.value)
+    mute_btn.on_click = lambda _: player.toggle_mute()
+    visualizer_btn.on_click = toggle_visualizer
+    silence_btn.on_click = lambda _: player.toggle_skip_silence()
+    page.on_close = on_close
     
     # Custom title bar sem botão de fechar
     title_text = ft.Text(
@@ -395,6 +291,10 @@ def main(page: ft.Page):
                 title_text,
                 ft.Container(expand=True),  # Spacer
                 # Botão de fechar removido
+                smart_menu,
+                silence_btn,
+                eq_menu,
+                visualizer_btn
             ],
             alignment=ft.MainAxisAlignment.SPACE_BETWEEN
         ),
@@ -445,6 +345,7 @@ def main(page: ft.Page):
             header,
             pick_files_btn,
             art_container,
+            visualizer_view,
             progress_row,
             controls
         ],
@@ -462,6 +363,19 @@ def main(page: ft.Page):
     )
     
     page.add(main_container)
+    
+    # Estado atual primeiro, depois só as mudanças
+    on_state(player.state())
+    unsubscribe = player.subscribe(on_state)
 
 if __name__ == "__main__":
+    # API local de controle sobre o mesmo player das janelas
+    atexit.register(get_controller().close)
+    try:
+        server = control_api.start(get_controller())
+        # Remove o token desta execução ao sair
+        atexit.register(server.stop)
+    except OSError as e:
+        # Porta ocupada (ex.: outra instância): o player abre sem a API
+        print(f"API de controle indisponível: {e}")
     ft.app(target=main)
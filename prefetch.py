@@ -0,0 +1,163 @@
+# Pré-carregamento das próximas faixas da fila no cache de páginas do sistema
+
+# Import required libraries
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+# Quantas faixas à frente pré-carregar
+PREFETCH_DEPTH = 3
+# Inícios de faixa guardados para o relatório (os mais recentes)
+MAX_FIRST_SAMPLE_TIMES = 1000
+# Orçamento de I/O por rodada e vazão máxima das leituras
+BUDGET_BYTES = 64 * 1024 * 1024
+MAX_BYTES_PER_SECOND = 32 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+
+
+class Prefetcher:
+    """Warms upcoming tracks into the page cache in a background thread"""
+
+    def __init__(self, budget_bytes=BUDGET_BYTES, max_bytes_per_second=MAX_BYTES_PER_SECOND, read_size=READ_SIZE, use_fadvise=hasattr(os, "posix_fadvise")):
+        self.budget_bytes = budget_bytes
+        self.max_bytes_per_second = max_bytes_per_second
+        self.read_size = read_size
+        # Sem fadvise as páginas são lidas aqui: ao terminar já estão no cache
+        self.use_fadvise = use_fadvise
+        # Faixas inteiras já pré-carregadas (com fadvise: pedidas ao kernel)
+        self.warmed = set()
+        # Tempo até a primeira amostra: {"warm": [...], "cold": [...]}
+        self.first_sample_times = {
+            "warm": deque(maxlen=MAX_FIRST_SAMPLE_TIMES),
+            "cold": deque(maxlen=MAX_FIRST_SAMPLE_TIMES)
+        }
+
+        self._paths = []
+        self._generation = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def schedule(self, paths):
+        """Replace the pending job with the given paths (cancels the current one)"""
+        with self._condition:
+            self._generation += 1
+            self._paths = list(paths)
+            self._condition.notify()
+
+    def cancel(self):
+        self.schedule([])
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._generation += 1
+            self._condition.notify()
+        self._thread.join()
+
+    def record_first_sample(self, path, seconds):
+        """Store the time to first sample of a track start"""
+        kind = "warm" if path in self.warmed else "cold"
+        self.first_sample_times[kind].append(seconds)
+
+    def report(self):
+        """Average time to first sample for warm and cold starts"""
+        lines = []
+        for kind, times in self.first_sample_times.items():
+            if times:
+                lines.append(f"{kind}: {len(times)} faixas, média {sum(times) / len(times) * 1000:.1f} ms")
+        return "\n".join(lines)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._paths and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                paths, self._paths = self._paths, []
+                generation = self._generation
+                # Só interessam as faixas da rodada atual
+                self.warmed.intersection_update(paths)
+
+            budget = self.budget_bytes
+            for path in paths:
+                if budget <= 0 or generation != self._generation:
+                    break
+                try:
+                    budget -= self._warm(path, budget, generation)
+                except OSError:
+                    # Arquivo sumiu ou montagem indisponível: a reprodução trata depois
+                    continue
+
+    def _warm(self, path, budget, generation):
+        """Bring up to budget bytes of a file into the cache, return bytes used"""
+        if path in self.warmed:
+            return 0
+        full = os.path.getsize(path)
+        size = min(full, budget)
+        with open(path, "rb", buffering=0) as f:
+            if self.use_fadvise:
+                # O kernel lê em segundo plano, sem passar os dados por aqui
+                os.posix_fadvise(f.fileno(), 0, size, os.POSIX_FADV_WILLNEED)
+            else:
+                done = 0
+                start = time.perf_counter()
+                while done < size:
+                    if generation != self._generation:
+                        return done
+                    chunk = f.read(min(self.read_size, size - done))
+                    if not chunk:
+                        break
+                    done += len(chunk)
+                    # Limitar a vazão para não competir com a faixa tocando
+                    ahead = done / self.max_bytes_per_second - (time.perf_counter() - start)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        if size == full:
+            # Um início cortado pelo orçamento não conta como faixa pré-carregada
+            self.warmed.add(path)
+        return size
+
+
+def evict(path):
+    """Drop a file from the page cache (where the OS allows it)"""
+    if hasattr(os, "posix_fadvise"):
+        with open(path, "rb") as f:
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def benchmark(paths):
+    """Compare time to first sample of cold and prefetched starts"""
+    import decoder
+
+    # Caminho de leitura: com fadvise o pedido volta antes de as páginas
+    # chegarem, e a medida "quente" poderia ser de um arquivo ainda frio
+    prefetcher = Prefetcher(budget_bytes=float("inf"), max_bytes_per_second=float("inf"), use_fadvise=False)
+    for path in paths:
+        evict(path)
+        start = time.perf_counter()
+        track = decoder.open_track(path)
+        track.wait_ready()
+        prefetcher.record_first_sample(path, time.perf_counter() - start)
+        track.cancel()
+
+        evict(path)
+        prefetcher.schedule([path])
+        # Espera o pré-carregamento terminar antes de medir
+        while path not in prefetcher.warmed:
+            time.sleep(0.01)
+        start = time.perf_counter()
+        track = decoder.open_track(path)
+        track.wait_ready()
+        prefetcher.record_first_sample(path, time.perf_counter() - start)
+        track.cancel()
+    prefetcher.close()
+    print(prefetcher.report())
+
+
+if __name__ == "__main__":
+    benchmark(sys.argv[1:])
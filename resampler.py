@@ -0,0 +1,204 @@
+# Conversão de taxa de amostragem e de canais para o formato do dispositivo de saída
+
+# Import required libraries
+import math
+import os
+import time
+from functools import lru_cache
+
+import numpy as np
+
+# Formato fixo do dispositivo de saída
+OUTPUT_RATE = 44100
+OUTPUT_CHANNELS = 2
+
+# Níveis de qualidade: mais taps por fase = melhor rejeição de aliasing, mais CPU.
+# Só valem para os formatos que o decoder lê na taxa original (decoder.NATIVE_FORMATS)
+QUALITY_TIERS = {
+    "low": {"taps": 8, "cutoff": 0.80, "beta": 5.0},
+    "medium": {"taps": 16, "cutoff": 0.90, "beta": 7.0},
+    "high": {"taps": 32, "cutoff": 0.94, "beta": 8.6},
+    "best": {"taps": 64, "cutoff": 0.97, "beta": 10.0},
+}
+DEFAULT_QUALITY = "medium"
+# Máquinas fracas podem trocar qualidade por CPU (ex.: MUSIC_PLAYER_QUALITY=low)
+QUALITY_ENV = "MUSIC_PLAYER_QUALITY"
+
+# Número de frames de saída processados por vez (limita a memória das janelas)
+CHUNK_FRAMES = 16384
+
+
+@lru_cache(maxsize=32)
+def design_filter(src_rate, dst_rate, quality=DEFAULT_QUALITY):
+    """Build the polyphase filter bank for a rate pair (cached per pair and tier)"""
+    tier = QUALITY_TIERS[quality]
+    g = math.gcd(src_rate, dst_rate)
+    up = dst_rate // g
+    down = src_rate // g
+    taps = tier["taps"]
+    length = taps * up
+
+    # Passa-baixa na taxa interpolada, com corte abaixo da menor das duas Nyquist
+    cutoff = 0.5 * tier["cutoff"] / max(up, down)
+    m = np.arange(length) - (length - 1) / 2
+    prototype = 2 * cutoff * np.sinc(2 * cutoff * m) * np.kaiser(length, tier["beta"])
+    # Ganho unitário em cada fase (compensa a inserção de zeros)
+    prototype *= up / prototype.sum()
+
+    # bank[p, j] multiplica x[i - taps + 1 + j] na fase p (coeficientes já invertidos)
+    bank = prototype.reshape(taps, up).T[:, ::-1]
+    bank = np.ascontiguousarray(bank, dtype=np.float32)
+    delay = (length - 1) // 2
+    return bank, up, down, delay
+
+
+def quality_from_env():
+    """Tier chosen in the environment, or None if unset or unknown"""
+    quality = os.environ.get(QUALITY_ENV, "").strip().lower()
+    if not quality:
+        return None
+    if quality not in QUALITY_TIERS:
+        print(f"Qualidade desconhecida em {QUALITY_ENV}: {quality} (use {', '.join(QUALITY_TIERS)})")
+        return None
+    return quality
+
+
+def convert_channels(samples, channels):
+    """Convert a (frames, channels) block to the given channel count"""
+    src_channels = samples.shape[1]
+    if src_channels == channels:
+        return samples
+    if channels == 1:
+        return samples.mean(axis=1, keepdims=True, dtype=np.float32)
+    if src_channels == 1:
+        return np.repeat(samples, channels, axis=1)
+    if src_channels > channels:
+        return samples[:, :channels]
+    # Repete o último canal para completar
+    extra = np.repeat(samples[:, -1:], channels - src_channels, axis=1)
+    return np.concatenate([samples, extra], axis=1)
+
+
+def resample(samples, src_rate, dst_rate=OUTPUT_RATE, quality=DEFAULT_QUALITY):
+    """Resample a (frames, channels) float32 block with a polyphase FIR"""
+    if src_rate == dst_rate or len(samples) == 0:
+        return samples
+
+    bank, up, down, delay = design_filter(src_rate, dst_rate, quality)
+    taps = bank.shape[1]
+    frames, channels = samples.shape
+    out_frames = -(-frames * up // down)
+
+    # Zeros antes e depois para que todas as janelas fiquem dentro do array
+    padded = np.zeros((frames + 2 * taps + 1, channels), dtype=np.float32)
+    padded[taps - 1:taps - 1 + frames] = samples
+
+    out = np.empty((out_frames, channels), dtype=np.float32)
+    offsets = np.arange(taps)
+    for start in range(0, out_frames, CHUNK_FRAMES):
+        n = np.arange(start, min(start + CHUNK_FRAMES, out_frames), dtype=np.int64)
+        t = n * down + delay
+        index = t // up
+        phase = t % up
+        windows = padded[index[:, None] + offsets]
+        out[start:start + len(n)] = np.einsum("nk,nkc->nc", bank[phase], windows)
+    return out
+
+
+class StreamResampler:
+    """Block by block version of convert(): same output, carrying the filter
+    history between blocks so a track can be played while it is decoded"""
+
+    def __init__(self, src_rate, dst_rate=OUTPUT_RATE, channels=OUTPUT_CHANNELS, quality=DEFAULT_QUALITY):
+        self.src_rate = src_rate
+        self.dst_rate = dst_rate
+        self.channels = channels
+        self.quality = quality
+        self.in_frames = 0
+        if src_rate == dst_rate:
+            return
+        self.bank, self.up, self.down, self.delay = design_filter(src_rate, dst_rate, quality)
+        self.taps = self.bank.shape[1]
+        # Entrada ainda necessária, com os mesmos zeros iniciais de resample()
+        self._buffer = None
+        self._base = 0
+        self._next = 0
+
+    def output_frames(self, in_frames):
+        """Output length for a given input length (as convert() would produce)"""
+        if self.src_rate == self.dst_rate:
+            return in_frames
+        return -(-in_frames * self.up // self.down)
+
+    def process(self, samples, final=False):
+        """Convert the next input block; final=True flushes the tail"""
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.ndim == 1:
+            samples = samples[:, None]
+        if samples.shape[1] > self.channels:
+            samples = convert_channels(samples, self.channels)
+        self.in_frames += len(samples)
+        if self.src_rate == self.dst_rate:
+            return convert_channels(samples, self.channels)
+
+        if self._buffer is None:
+            self._buffer = np.zeros((self.taps - 1, samples.shape[1]), dtype=np.float32)
+        parts = [self._buffer, samples]
+        if final:
+            parts.append(np.zeros((self.taps + 2, samples.shape[1]), dtype=np.float32))
+        self._buffer = np.concatenate(parts)
+
+        if final:
+            limit = self.output_frames(self.in_frames)
+        else:
+            # Última saída cuja janela já está toda no buffer
+            last_index = self._base + len(self._buffer) - self.taps
+            limit = max(((last_index + 1) * self.up - 1 - self.delay) // self.down + 1, self._next)
+
+        out = np.empty((limit - self._next, self._buffer.shape[1]), dtype=np.float32)
+        offsets = np.arange(self.taps)
+        for start in range(self._next, limit, CHUNK_FRAMES):
+            n = np.arange(start, min(start + CHUNK_FRAMES, limit), dtype=np.int64)
+            t = n * self.down + self.delay
+            windows = self._buffer[(t // self.up - self._base)[:, None] + offsets]
+            out[start - self._next:start - self._next + len(n)] = np.einsum("nk,nkc->nc", self.bank[t % self.up], windows)
+        self._next = limit
+
+        # Descarta a entrada que nenhuma saída futura usa
+        keep_from = (self._next * self.down + self.delay) // self.up - self._base
+        if keep_from > 0:
+            self._buffer = self._buffer[keep_from:]
+            self._base += keep_from
+        return convert_channels(out, self.channels)
+
+
+def convert(samples, src_rate, dst_rate=OUTPUT_RATE, channels=OUTPUT_CHANNELS, quality=DEFAULT_QUALITY):
+    """Convert decoded PCM to the output rate and channel layout"""
+    samples = np.asarray(samples, dtype=np.float32)
+    if samples.ndim == 1:
+        samples = samples[:, None]
+
+    # Reduzir canais antes de reamostrar e aumentar depois: menos canais para filtrar
+    if samples.shape[1] > channels:
+        samples = convert_channels(samples, channels)
+    samples = resample(samples, src_rate, dst_rate, quality)
+    return convert_channels(samples, channels)
+
+
+def benchmark(seconds=10, rate_pairs=((44100, 48000), (48000, 44100), (88200, 44100), (96000, 44100))):
+    """Print the real-time factor of each quality tier for common rate pairs"""
+    rng = np.random.default_rng(0)
+    print(f"{'src':>6} -> {'dst':>6}  {'tier':<7} {'RTF':>8}")
+    for src_rate, dst_rate in rate_pairs:
+        samples = rng.uniform(-1, 1, (src_rate * seconds, 2)).astype(np.float32)
+        for quality in QUALITY_TIERS:
+            design_filter(src_rate, dst_rate, quality)  # Fora da medição (cache)
+            start = time.perf_counter()
+            convert(samples, src_rate, dst_rate, quality=quality)
+            elapsed = time.perf_counter() - start
+            # RTF < 1 significa mais rápido que o tempo real
+            print(f"{src_rate:>6} -> {dst_rate:>6}  {quality:<7} {elapsed / seconds:>8.4f}")
+
+
+if __name__ == "__main__":
+    benchmark()
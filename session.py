@@ -0,0 +1,263 @@
+# Snapshot compacto da sessão (fila, modos, volume e posição) para restauração rápida
+#
+# A fila (caminhos, ordem, durações) só é regravada quando muda; posição, modos e
+# volume vão num registro pequeno ao lado, ligado ao snapshot pelo CRC dele
+
+# Import required libraries
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from pathlib import Path
+
+import resampler
+
+SESSION_PATH = Path.home() / ".music_player" / "session.bin"
+# Intervalo mínimo entre gravações
+DEBOUNCE_SECONDS = 1.0
+
+MAGIC = b"MPS1"
+# magic, índice na ordem, flags, volume, último volume, posição, nº de faixas, bytes comprimidos
+HEADER = struct.Struct("<4sIBffdII")
+FLAG_LOOP = 1
+FLAG_RANDOM = 2
+FLAG_MUTED = 4
+# Invertido: sessões antigas (sem o bit) continuam pulando silêncio
+FLAG_KEEP_SILENCE = 8
+FLAG_WEIGHTED = 16
+# Bits 5-7: nível de qualidade do resampler + 1 (0 = não escolhido)
+QUALITY_SHIFT = 5
+QUALITY_NAMES = list(resampler.QUALITY_TIERS)
+
+RECORD_MAGIC = b"MPR1"
+# magic, CRC do snapshot, índice na ordem, flags, volume, último volume, posição
+RECORD = struct.Struct("<4sIIBffd")
+
+
+def record_path(path):
+    """Small record kept next to the snapshot"""
+    return Path(path).with_suffix(".pos")
+
+
+def encode_flags(state):
+    return ((FLAG_LOOP if state["is_loop"] else 0)
+            | (FLAG_RANDOM if state["is_random"] else 0)
+            | (FLAG_MUTED if state["is_muted"] else 0)
+            | (0 if state.get("skip_silence", True) else FLAG_KEEP_SILENCE)
+            | (FLAG_WEIGHTED if state.get("is_weighted") else 0)
+            | (QUALITY_NAMES.index(state["quality"]) + 1 if state.get("quality") else 0) << QUALITY_SHIFT)
+
+
+def decode_flags(flags):
+    return {
+        "is_loop": bool(flags & FLAG_LOOP),
+        "is_random": bool(flags & FLAG_RANDOM),
+        "is_muted": bool(flags & FLAG_MUTED),
+        "skip_silence": not flags & FLAG_KEEP_SILENCE,
+        "is_weighted": bool(flags & FLAG_WEIGHTED),
+        "quality": QUALITY_NAMES[(flags >> QUALITY_SHIFT) - 1] if flags >> QUALITY_SHIFT else None,
+    }
+
+
+def encode(state):
+    """Pack a session state dict into bytes"""
+    tracks = state["tracks"]
+    flags = encode_flags(state)
+    # Caminhos compartilham prefixos (pastas): comprimem muito bem
+    paths = zlib.compress("\0".join(tracks).encode("utf-8"))
+    durations = state.get("durations", {})
+    header = HEADER.pack(
+        MAGIC,
+        state["queue_position"],
+        flags,
+        state["volume"],
+        state["last_volume"],
+        state["position"],
+        len(tracks),
+        len(paths)
+    )
+    return b"".join([
+        header,
+        array("I", state["order"]).tobytes(),
+        array("d", (durations.get(t, 0.0) for t in tracks)).tobytes(),
+        paths
+    ])
+
+
+def decode(data):
+    """Unpack bytes written by encode"""
+    magic, queue_position, flags, volume, last_volume, position, count, paths_size = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Snapshot de sessão inválido")
+    offset = HEADER.size
+    order = array("I")
+    order.frombytes(data[offset:offset + 4 * count])
+    offset += 4 * count
+    durations = array("d")
+    durations.frombytes(data[offset:offset + 8 * count])
+    offset += 8 * count
+    text = zlib.decompress(data[offset:offset + paths_size]).decode("utf-8")
+    tracks = text.split("\0") if count else []
+    return {
+        "tracks": tracks,
+        "order": order.tolist(),
+        "queue_position": queue_position,
+        **decode_flags(flags),
+        "volume": volume,
+        "last_volume": last_volume,
+        "position": position,
+        # Metadados em cache: nada é re-analisado na abertura
+        "durations": {t: d for t, d in zip(tracks, durations) if d > 0}
+    }
+
+
+def encode_record(state, crc):
+    """Pack position, modes and volume for the snapshot with the given CRC"""
+    return RECORD.pack(RECORD_MAGIC, crc, state["queue_position"], encode_flags(state),
+                       state["volume"], state["last_volume"], state["position"])
+
+
+def decode_record(data, crc):
+    """Unpack a record; ValueError if it belongs to another snapshot"""
+    magic, record_crc, queue_position, flags, volume, last_volume, position = RECORD.unpack(data)
+    if magic != RECORD_MAGIC or record_crc != crc:
+        raise ValueError("Registro de sessão de outro snapshot")
+    return {"queue_position": queue_position, **decode_flags(flags),
+            "volume": volume, "last_volume": last_volume, "position": position}
+
+
+def load(path=SESSION_PATH):
+    """Read the last session, or None if there is none (or it is unreadable)"""
+    try:
+        data = Path(path).read_bytes()
+        state = decode(data)
+    except (OSError, ValueError, struct.error, zlib.error):
+        return None
+    # Posição e modos mais recentes, se o registro for deste snapshot
+    try:
+        state.update(decode_record(record_path(path).read_bytes(), zlib.crc32(data)))
+    except (OSError, ValueError, struct.error):
+        pass
+    return state
+
+
+def write(state, path=SESSION_PATH):
+    """Write the snapshot atomically (temp file + rename); returns its CRC"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = encode(state)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return zlib.crc32(data)
+
+
+def write_record(state, crc, path=SESSION_PATH):
+    """Write the small record atomically; no fsync: losing it in a crash only
+    falls back to the position stored in the snapshot"""
+    target = record_path(path)
+    tmp = target.with_suffix(".tmp")
+    tmp.write_bytes(encode_record(state, crc))
+    os.replace(tmp, target)
+
+
+class SessionStore:
+    """Saves session snapshots in the background, at most once per debounce interval.
+    States with "tracks" rewrite the snapshot; the others only the small record"""
+
+    def __init__(self, path=SESSION_PATH, debounce=DEBOUNCE_SECONDS):
+        self.path = path
+        self.debounce = debounce
+        self._state = None
+        # CRC do snapshot em disco (o registro só vale junto com ele)
+        try:
+            self._crc = zlib.crc32(Path(path).read_bytes())
+        except OSError:
+            self._crc = None
+        self._deadline = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def save_later(self, state):
+        """Schedule a write of the latest state (include tracks, order and
+        durations only when the queue changed)"""
+        with self._condition:
+            if self._state is not None and "tracks" in self._state and "tracks" not in state:
+                # Fila ainda não gravada: continua pendente
+                state = {**self._state, **state}
+            self._state = state
+            # Não adiar um prazo já marcado: mudanças contínuas ainda gravam
+            if self._deadline is None:
+                self._deadline = time.monotonic() + self.debounce
+                self._condition.notify()
+
+    def flush(self):
+        """Write any pending state now"""
+        with self._condition:
+            state, self._state, self._deadline = self._state, None, None
+        if state is None:
+            return
+        if "tracks" in state:
+            self._crc = write(state, self.path)
+        elif self._crc is not None:
+            write_record(state, self._crc, self.path)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and (self._deadline is None or time.monotonic() < self._deadline):
+                    timeout = None if self._deadline is None else self._deadline - time.monotonic()
+                    self._condition.wait(timeout)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Erro ao salvar sessão: {e}")
+
+
+if __name__ == "__main__":
+    # Tempo de restauração de uma sessão grande
+    import tempfile
+
+    tracks = [f"C:/Users/music/Album {i // 12}/{i % 12:02d} - Faixa {i}.mp3" for i in range(20000)]
+    state = {
+        "tracks": tracks,
+        "order": list(range(len(tracks)))[::-1],
+        "queue_position": 123,
+        "is_loop": False,
+        "is_random": True,
+        "is_muted": False,
+        "volume": 80.0,
+        "last_volume": 80.0,
+        "position": 42.5,
+        "durations": {t: 180.0 for t in tracks}
+    }
+    target = Path(tempfile.gettempdir()) / "session_benchmark.bin"
+    start = time.perf_counter()
+    crc = write(state, target)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{len(tracks)} faixas, {target.stat().st_size} bytes, gravado em {elapsed:.1f} ms")
+    start = time.perf_counter()
+    write_record(dict(state, position=99.0), crc, target)
+    print(f"Registro de posição: {RECORD.size} bytes, gravado em {(time.perf_counter() - start) * 1000:.2f} ms")
+    start = time.perf_counter()
+    restored = load(target)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"Restaurado em {elapsed:.1f} ms")
+    assert restored["order"] == state["order"] and restored["tracks"] == tracks
+    assert restored["position"] == 99.0
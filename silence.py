@@ -0,0 +1,143 @@
+# Detecção de silêncio no início e no fim das faixas, em segundo plano
+
+# Import required libraries
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+import decoder
+from metadata import MetadataCache
+
+# Análise em taxa reduzida e mono: basta para medir energia
+ANALYSIS_RATE = 11025
+# Janela do RMS e limiar abaixo do qual o trecho conta como silêncio
+WINDOW_SECONDS = 0.01
+THRESHOLD_DB = -60.0
+# Margem mantida antes do som e depois dele (não cortar ataques e fade-outs)
+PAD_SECONDS = 0.05
+
+
+def detect_silence(samples, rate):
+    """Return (lead, tail, loudness): where sound starts and ends, in seconds,
+    and the mean RMS level in dB of the part in between"""
+    samples = np.asarray(samples, dtype=np.float32)
+    if samples.ndim == 1:
+        samples = samples[:, None]
+    duration = len(samples) / rate
+    window = max(int(rate * WINDOW_SECONDS), 1)
+    count = len(samples) // window
+    if count == 0:
+        return 0.0, duration, -np.inf
+
+    # RMS de todas as janelas de uma vez
+    blocks = samples[:count * window].reshape(count, window, -1)
+    power = np.square(blocks).mean(axis=(1, 2))
+    threshold = 10 ** (THRESHOLD_DB / 10)
+    loud = np.flatnonzero(power > threshold)
+    if len(loud) == 0:
+        # Faixa inteira em silêncio: não mexe em nada
+        return 0.0, duration, -np.inf
+
+    lead = max(loud[0] * window / rate - PAD_SECONDS, 0.0)
+    tail = min((loud[-1] + 1) * window / rate + PAD_SECONDS, duration)
+    loudness = 10 * np.log10(power[loud[0]:loud[-1] + 1].mean())
+    return float(lead), float(tail), float(loudness)
+
+
+def analyze_file(path):
+    """Decode a track cheaply and return its metadata fields"""
+    samples = decoder.decode_file(path, rate=ANALYSIS_RATE, channels=1, quality="low")
+    lead, tail, loudness = detect_silence(samples, ANALYSIS_RATE)
+    return {"duration": len(samples) / ANALYSIS_RATE, "lead": lead, "tail": tail, "loudness": loudness}
+
+
+class SilenceScanner:
+    """Analyzes queued tracks in a background thread and caches the results"""
+
+    def __init__(self, cache=None, on_result=None):
+        self.cache = cache or MetadataCache()
+        # Chamado (na thread de análise) com (caminho, campos) de cada faixa nova
+        self.on_result = on_result
+        self._pending = {}
+        self._paths = []
+        # Biblioteca inteira: analisada só quando não há nada mais urgente
+        self._backlog = []
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def lookup(self, path):
+        return self.cache.get(path)
+
+    def schedule(self, paths):
+        """Replace the pending paths (already cached ones are skipped)"""
+        with self._condition:
+            self._paths = list(paths)
+            self._condition.notify()
+
+    def scan(self, paths):
+        """Queue tracks for analysis at the lowest priority"""
+        with self._condition:
+            self._backlog.extend(paths)
+            self._condition.notify()
+
+    def submit(self, path, track):
+        """Analyze the track being played from its DecodedTrack, ahead of the queue
+        (the analysis waits for the decode instead of decoding the file again)"""
+        with self._condition:
+            self._pending[path] = track
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.cache.close()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._paths and not self._pending and not self._backlog and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                if self._pending:
+                    job = self._pending.popitem()
+                elif self._paths:
+                    job = (self._paths.pop(0), None)
+                else:
+                    job = (self._backlog.pop(), None)
+            self._analyze(*job)
+
+    def _analyze(self, path, track):
+        try:
+            if self.cache.get(path) is not None:
+                return
+            if track is None:
+                fields = analyze_file(path)
+            else:
+                samples, rate = track.result(), track.rate
+                lead, tail, loudness = detect_silence(samples, rate)
+                fields = {"duration": len(samples) / rate, "lead": lead, "tail": tail, "loudness": loudness}
+            self.cache.put(path, fields)
+        except Exception as e:
+            # Arquivo sumiu ou formato inválido: a reprodução trata depois
+            print(f"Erro ao analisar silêncio de {path}: {e}")
+            return
+        if self.on_result:
+            self.on_result(path, fields)
+
+
+if __name__ == "__main__":
+    # Uso: python silence.py <arquivos...>
+    for path in sys.argv[1:]:
+        start = time.perf_counter()
+        fields = analyze_file(path)
+        print(f"{os.path.basename(path)}: som de {fields['lead']:.2f}s a {fields['tail']:.2f}s "
+              f"de {fields['duration']:.2f}s, {fields['loudness']:.1f} dB "
+              f"({(time.perf_counter() - start) * 1000:.0f} ms)")
@@ -0,0 +1,347 @@
+# Playlists inteligentes: regras sobre metadados e histórico, mantidas como visões vivas
+
+# Import required libraries
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+SMART_PLAYLISTS_PATH = Path.home() / ".music_player" / "smart_playlists.json"
+
+DAY = 86400
+# Campos numéricos da biblioteca (desconhecido = NaN, não casa com nada)
+NUMERIC_FIELDS = ("duration", "loudness", "plays")
+NUMERIC_OPS = ("between", "<", ">")
+# Campos com vocabulário pequeno: a regra é avaliada uma vez por valor distinto
+TEXT_FIELDS = ("folder", "format")
+TEXT_OPS = ("in", "under")
+LAST_PLAYED_OPS = ("within_days", "older_than_days", "never")
+
+
+def validate_rule(rule):
+    """Raise ValueError for a rule the evaluator does not understand"""
+    field, op = rule.get("field"), rule.get("op")
+    if field in NUMERIC_FIELDS:
+        valid = op in NUMERIC_OPS
+    elif field in TEXT_FIELDS:
+        valid = op in TEXT_OPS and not (field == "format" and op == "under")
+    elif field == "last_played":
+        valid = op in LAST_PLAYED_OPS
+    else:
+        raise ValueError(f"Campo desconhecido: {field}")
+    if not valid:
+        raise ValueError(f"Operação {op} inválida para {field}")
+    if op != "never" and "value" not in rule:
+        raise ValueError(f"Regra sem valor: {field} {op}")
+
+
+class Library:
+    """Column store of every known track (one row per path, rows never move)"""
+
+    def __init__(self):
+        self.paths = []
+        self.rows = {}
+        self.size = 0
+        self.alive = np.zeros(0, dtype=bool)
+        self.duration = np.zeros(0)
+        self.loudness = np.zeros(0)
+        self.plays = np.zeros(0)
+        self.last_played = np.zeros(0)
+        self.folder = np.zeros(0, dtype=np.int32)
+        self.format = np.zeros(0, dtype=np.int32)
+        # Vocabulários: pastas e extensões distintas
+        self.folders = []
+        self.formats = []
+        self._folder_ids = {}
+        self._format_ids = {}
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self, size):
+        capacity = len(self.alive)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 1024)
+        for name, fill in (("alive", False), ("duration", np.nan), ("loudness", np.nan),
+                           ("plays", 0), ("last_played", 0), ("folder", 0), ("format", 0)):
+            array = getattr(self, name)
+            grown = np.full(capacity, fill, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    @staticmethod
+    def _code(vocabulary, ids, value):
+        code = ids.get(value)
+        if code is None:
+            code = ids[value] = len(vocabulary)
+            vocabulary.append(value)
+        return code
+
+    def add(self, paths):
+        """Add new paths (known ones are revived) and return their rows"""
+        rows = []
+        for path in paths:
+            row = self.rows.get(path)
+            if row is None:
+                row = self.rows[path] = self.size
+                self._grow(self.size + 1)
+                self.size += 1
+                self.paths.append(path)
+                self.folder[row] = self._code(self.folders, self._folder_ids, os.path.dirname(path))
+                self.format[row] = self._code(self.formats, self._format_ids, Path(path).suffix.lower()[1:])
+            self.alive[row] = True
+            rows.append(row)
+        return np.array(rows, dtype=np.int64)
+
+    def remove(self, paths):
+        rows = np.array([self.rows[p] for p in paths if p in self.rows], dtype=np.int64)
+        self.alive[rows] = False
+        return rows
+
+    def set_fields(self, path, fields):
+        """Update columns of one track; returns its row or None"""
+        row = self.rows.get(path)
+        if row is None:
+            return None
+        for name, value in fields.items():
+            if name in ("duration", "loudness", "plays", "last_played"):
+                getattr(self, name)[row] = value
+        return row
+
+
+class SmartPlaylist:
+    """Rules over the library plus the materialized membership mask"""
+
+    def __init__(self, name, rules, match="all"):
+        for rule in rules:
+            validate_rule(rule)
+        if match not in ("all", "any"):
+            raise ValueError(f"Combinação inválida: {match}")
+        self.name = name
+        self.rules = rules
+        self.match = match
+        self.mask = np.zeros(0, dtype=bool)
+        # Resultado por valor do vocabulário, estendido quando surgem pastas/formatos novos
+        self._vocabulary_matches = [None] * len(rules)
+
+    def to_dict(self):
+        return {"rules": self.rules, "match": self.match}
+
+    def _vocabulary_match(self, i, rule, vocabulary):
+        cached = self._vocabulary_matches[i]
+        done = 0 if cached is None else len(cached)
+        if done < len(vocabulary):
+            values = rule["value"] if isinstance(rule["value"], list) else [rule["value"]]
+            if rule["op"] == "in":
+                new = [v in values for v in vocabulary[done:]]
+            else:
+                # Pasta ou subpasta de alguma das indicadas
+                prefixes = [os.path.join(os.path.normcase(v), "") for v in values]
+                new = [os.path.join(os.path.normcase(v), "").startswith(tuple(prefixes)) for v in vocabulary[done:]]
+            cached = np.concatenate([cached if cached is not None else np.zeros(0, dtype=bool), np.array(new, dtype=bool)])
+            self._vocabulary_matches[i] = cached
+        return cached
+
+    def _rule_mask(self, i, rule, library, rows, now):
+        field, op, value = rule["field"], rule["op"], rule.get("value")
+        if field in TEXT_FIELDS:
+            vocabulary = library.folders if field == "folder" else library.formats
+            codes = getattr(library, field)[rows]
+            return self._vocabulary_match(i, rule, vocabulary)[codes]
+        if field == "last_played":
+            last = library.last_played[rows]
+            if op == "never":
+                return last == 0
+            if op == "within_days":
+                return (last > 0) & (now - last <= value * DAY)
+            # Nunca tocada também conta como "há mais de N dias"
+            return (last == 0) | (now - last > value * DAY)
+        column = getattr(library, field)[rows]
+        if op == "between":
+            return (column >= value[0]) & (column <= value[1])
+        if op == "<":
+            return column < value
+        return column > value
+
+    def evaluate(self, library, rows, now=None):
+        """Boolean membership of the given rows"""
+        now = time.time() if now is None else now
+        combined = library.alive[rows].copy()
+        if not self.rules:
+            return combined
+        masks = [self._rule_mask(i, rule, library, rows, now) for i, rule in enumerate(self.rules)]
+        if self.match == "all":
+            for mask in masks:
+                combined &= mask
+        else:
+            combined &= np.logical_or.reduce(masks)
+        return combined
+
+    def refresh(self, library, now=None):
+        """Full re-evaluation (also picks up time based rules drifting)"""
+        self.mask = np.zeros(len(library.alive), dtype=bool)
+        self.mask[:library.size] = self.evaluate(library, slice(0, library.size), now)
+
+    def update(self, library, rows, now=None):
+        """Re-evaluate only the changed rows; returns (added rows, removed rows)"""
+        if len(self.mask) < len(library.alive):
+            grown = np.zeros(len(library.alive), dtype=bool)
+            grown[:len(self.mask)] = self.mask
+            self.mask = grown
+        before = self.mask[rows]
+        after = self.evaluate(library, rows, now)
+        self.mask[rows] = after
+        return rows[after & ~before], rows[before & ~after]
+
+    def members(self, library):
+        return [library.paths[i] for i in np.flatnonzero(self.mask[:library.size])]
+
+    def __len__(self):
+        return int(np.count_nonzero(self.mask))
+
+
+class SmartPlaylists:
+    """Library plus named smart playlists, kept up to date row by row"""
+
+    def __init__(self, path=SMART_PLAYLISTS_PATH):
+        self.path = Path(path)
+        self.library = Library()
+        self.playlists = {}
+        # Chamado com (nome, caminhos que entraram, caminhos que saíram)
+        self.on_change = None
+        self._lock = threading.RLock()
+        self._load_definitions()
+
+    def _load_definitions(self):
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return
+        for name, spec in data.items():
+            try:
+                self.playlists[name] = SmartPlaylist(name, spec["rules"], spec.get("match", "all"))
+            except (KeyError, ValueError) as e:
+                print(f"Playlist inteligente ignorada ({name}): {e}")
+
+    def _save_definitions(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps({name: p.to_dict() for name, p in self.playlists.items()}))
+
+    def define(self, name, rules, match="all"):
+        """Create or replace a playlist and materialize it"""
+        playlist = SmartPlaylist(name, rules, match)
+        with self._lock:
+            playlist.refresh(self.library)
+            self.playlists[name] = playlist
+            self._save_definitions()
+        return playlist
+
+    def delete(self, name):
+        with self._lock:
+            if self.playlists.pop(name, None) is not None:
+                self._save_definitions()
+
+    def _changed(self, rows):
+        """Propagate changed rows to every playlist"""
+        if len(rows) == 0:
+            return
+        now = time.time()
+        for name, playlist in self.playlists.items():
+            added, removed = playlist.update(self.library, rows, now)
+            if self.on_change and (len(added) or len(removed)):
+                paths = self.library.paths
+                self.on_change(name, [paths[i] for i in added], [paths[i] for i in removed])
+
+    def add_tracks(self, paths, fields=None):
+        """Add tracks with their known columns ({path: {field: value}})"""
+        fields = fields or {}
+        with self._lock:
+            rows = self.library.add(paths)
+            for path, values in fields.items():
+                self.library.set_fields(path, values)
+            self._changed(rows)
+
+    def remove_tracks(self, paths):
+        with self._lock:
+            self._changed(self.library.remove(paths))
+
+    def update_track(self, path, fields):
+        """New metadata or play statistics for one track"""
+        with self._lock:
+            row = self.library.set_fields(path, fields)
+            if row is not None:
+                self._changed(np.array([row], dtype=np.int64))
+
+    def refresh(self):
+        """Re-evaluate everything (time based rules move on their own)"""
+        with self._lock:
+            for playlist in self.playlists.values():
+                playlist.refresh(self.library)
+
+    def members(self, name):
+        with self._lock:
+            return self.playlists[name].members(self.library)
+
+    def counts(self):
+        with self._lock:
+            return {name: len(playlist) for name, playlist in self.playlists.items()}
+
+
+def benchmark(tracks=200_000):
+    """Materialize a few playlists over a large library and time the updates"""
+    import tempfile
+
+    rng = np.random.default_rng(0)
+    folders = [f"C:/Users/music/Artista {i // 10}/Album {i}" for i in range(tracks // 12 + 1)]
+    paths = [f"{folders[i // 12]}/{i % 12:02d} - Faixa {i}.{'mp3' if i % 3 else 'wav'}" for i in range(tracks)]
+    now = time.time()
+    fields = {
+        path: {
+            "duration": d,
+            "loudness": l,
+            "plays": p,
+            "last_played": now - a if p else 0,
+        }
+        for path, d, l, p, a in zip(
+            paths,
+            rng.uniform(30, 600, tracks),
+            rng.uniform(-30, -5, tracks),
+            rng.poisson(2, tracks),
+            rng.uniform(0, 400 * DAY, tracks)
+        )
+    }
+    smart = SmartPlaylists(Path(tempfile.mkdtemp()) / "smart.json")
+    smart.add_tracks(paths, fields)
+
+    definitions = {
+        "curtas": [{"field": "duration", "op": "between", "value": [60, 180]}],
+        "esquecidas": [{"field": "last_played", "op": "older_than_days", "value": 180},
+                       {"field": "format", "op": "in", "value": ["mp3"]}],
+        "artista 42": [{"field": "folder", "op": "under", "value": "C:/Users/music/Artista 42"}],
+        "altas e novas": [{"field": "loudness", "op": ">", "value": -10},
+                          {"field": "last_played", "op": "never"}],
+        "favoritas": [{"field": "plays", "op": ">", "value": 5},
+                      {"field": "last_played", "op": "within_days", "value": 30}],
+    }
+    for name, rules in definitions.items():
+        smart.define(name, rules)
+
+    start = time.perf_counter()
+    smart.refresh()
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{len(definitions)} playlists sobre {tracks} faixas: {elapsed:.1f} ms")
+    print(", ".join(f"{name}: {count}" for name, count in smart.counts().items()))
+
+    start = time.perf_counter()
+    for path in paths[:1000]:
+        smart.update_track(path, {"plays": 10, "last_played": now})
+    print(f"1000 atualizações incrementais: {(time.perf_counter() - start) * 1000:.1f} ms")
+    assert elapsed < 50, "Avaliação das regras acima de 50 ms"
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,231 @@
+# Teste de longa duração: dias de reprodução simulada contra uma saída falsa,
+# procurando vazamento de threads, de memória e de atualizações da interface
+#
+# Uso: python soak.py [--hours 48] [--block 4096] [--seed 0]
+
+# Import required libraries
+import argparse
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import wave
+
+import numpy as np
+
+from controller import POSITION_INTERVAL, PlayerController
+from engine import FakeSink, PlaybackEngine
+import resampler
+
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+# Amostras descartadas antes de medir crescimento (caches enchendo, imports)
+WARMUP_FRACTION = 0.25
+# Folgas antes de considerar crescimento sem limite
+MAX_EXTRA_THREADS = 1
+MAX_MEMORY_GROWTH_BYTES = 2 * 1024 * 1024
+MAX_UPDATE_RATE_FACTOR = 1.5
+
+# Probabilidade de cada ação por minuto simulado
+ACTIONS = {
+    "next_track": 0.15,
+    "prev_track": 0.03,
+    "toggle_random": 0.02,
+    "seek": 0.05,
+    "pause": 0.03,
+    "toggle_visualizer": 0.01,
+    "toggle_loop": 0.005,
+    "toggle_skip_silence": 0.005,
+    "set_tracks": 0.001,
+}
+
+
+def make_tracks(folder, count=12, seed=0):
+    """Short WAV files with silence at the head and tail"""
+    rng = np.random.default_rng(seed)
+    rate = resampler.OUTPUT_RATE
+    paths = []
+    for i in range(count):
+        seconds = rng.uniform(20, 60)
+        t = np.arange(int(seconds * rate)) / rate
+        tone = 0.3 * np.sin(2 * np.pi * rng.uniform(110, 880) * t)
+        # Conteúdos diferentes: a busca de duplicadas não remove nada
+        tone *= 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(0.1, 2) * t)
+        audio = np.concatenate([np.zeros(int(rng.uniform(0, 3) * rate)), tone, np.zeros(int(rng.uniform(0, 3) * rate))])
+        pcm = (np.stack([audio, audio], axis=1) * 32767).astype("<i2")
+        path = os.path.join(folder, f"faixa_{i:02d}.wav")
+        with wave.open(path, "wb") as f:
+            f.setnchannels(2)
+            f.setsampwidth(2)
+            f.setframerate(rate)
+            f.writeframes(pcm.tobytes())
+        paths.append(path)
+    return paths
+
+
+def growth_failures(samples):
+    """Compare the samples after warm-up against the first ones after it"""
+    failures = []
+    start = max(int(len(samples) * WARMUP_FRACTION), 1)
+    steady = samples[start:]
+    if len(steady) < 4:
+        return ["Poucas amostras: aumente --hours"]
+    half = len(steady) // 2
+    first, last = steady[:half], steady[half:]
+
+    # Mínimos: threads de curta duração (fim de faixa, análise) não contam
+    threads_first = min(s["threads"] for s in first)
+    threads_last = min(s["threads"] for s in last)
+    if threads_last > threads_first + MAX_EXTRA_THREADS:
+        failures.append(f"Threads crescendo: {threads_first} -> {threads_last}")
+
+    memory_first = min(s["memory"] for s in first)
+    memory_last = min(s["memory"] for s in last)
+    # Inclinação da memória por amostra na parte estável
+    slope = np.polyfit(np.arange(len(steady)), [s["memory"] for s in steady], 1)[0]
+    if memory_last - memory_first > MAX_MEMORY_GROWTH_BYTES and slope > 0:
+        failures.append(f"Memória crescendo: {memory_first / 1024:.0f} KiB -> {memory_last / 1024:.0f} KiB "
+                        f"({slope / 1024:.1f} KiB por hora simulada)")
+
+    # Eventos por hora simulada (a velocidade da simulação varia com a decodificação)
+    events_first = np.mean([s["events"] for s in first])
+    events_last = np.mean([s["events"] for s in last])
+    if events_last > events_first * MAX_UPDATE_RATE_FACTOR + 2:
+        failures.append(f"Atualizações da interface crescendo: {events_first:.0f}/h -> {events_last:.0f}/h")
+    # Posição: uma thread, no máximo uma publicação por intervalo de tempo real
+    ticks = max(s["tick_rate"] for s in steady)
+    if ticks > MAX_UPDATE_RATE_FACTOR / POSITION_INTERVAL:
+        failures.append(f"Publicações de posição acima do intervalo: {ticks:.1f}/s")
+    return failures
+
+
+def soak(hours=48, block_frames=4096, seed=0):
+    """Run the simulation in a temporary folder, removed afterwards even on
+    errors or Ctrl-C, and return the per-hour samples"""
+    home = tempfile.mkdtemp(prefix="music_player_soak_")
+    try:
+        return _simulate(hours, block_frames, seed, home)
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+
+def _simulate(hours, block_frames, seed, home):
+    rng = np.random.default_rng(seed)
+    tracks_folder = os.path.join(home, "tracks")
+    os.makedirs(tracks_folder)
+    paths = make_tracks(tracks_folder, seed=seed)
+
+    engine = PlaybackEngine()
+    sink = FakeSink(engine, block_frames=block_frames, latency_frames=block_frames)
+    # Tudo que o player grava (sessão, histórico, caches) fica na pasta temporária
+    data = os.path.join(home, "data")
+    controller = PlayerController(
+        engine=engine,
+        sink=sink,
+        session_path=os.path.join(data, "session.bin"),
+        history_path=os.path.join(data, "history.bin"),
+        metadata_path=os.path.join(data, "metadata.sqlite"),
+        fingerprint_path=os.path.join(data, "fingerprints.sqlite"),
+        smart_playlists_path=os.path.join(data, "smart_playlists.json"),
+        eq_path=os.path.join(data, "equalizer.json")
+    )
+
+    ticks = events = 0
+
+    def on_state(delta):
+        nonlocal ticks, events
+        # Publicações do ticker contam à parte: o resto responde a ações e trocas de faixa
+        if threading.current_thread() is controller._ticker:
+            ticks += 1
+        else:
+            events += 1
+
+    try:
+        # Chamado na thread que publica: é ela que identifica o ticker
+        unsubscribe = controller.subscribe(on_state, threaded=False)
+        controller.set_tracks(paths)
+        controller.play()
+
+        tracemalloc.start()
+        rate = engine.rate
+        blocks_per_minute = rate * 60 / block_frames
+        minute_probabilities = np.array(list(ACTIONS.values()))
+        action_names = list(ACTIONS)
+        visualizer = False
+        paused_blocks = 0
+        samples = []
+        started = time.perf_counter()
+        sample_wall = started
+        sample_ticks = sample_events = 0
+
+        total_blocks = int(hours * 3600 * rate / block_frames)
+        blocks_per_hour = int(3600 * rate / block_frames)
+        for block in range(1, total_blocks + 1):
+            sink.pull()
+
+            if paused_blocks:
+                paused_blocks -= 1
+                if paused_blocks == 0:
+                    controller.play()
+            elif block % int(blocks_per_minute) == 0:
+                # Sorteio das ações deste minuto simulado
+                for name in np.array(action_names)[rng.random(len(action_names)) < minute_probabilities]:
+                    if name == "seek":
+                        controller.seek(rng.uniform(0, max(controller.track_duration, 1)))
+                    elif name == "pause":
+                        controller.pause()
+                        paused_blocks = int(rng.integers(1, 20))
+                    elif name == "toggle_visualizer":
+                        visualizer = not visualizer
+                        controller.show_visualizer() if visualizer else controller.hide_visualizer()
+                    elif name == "set_tracks":
+                        controller.set_tracks(list(rng.permutation(paths)))
+                        controller.play_current_track()
+                    else:
+                        getattr(controller, name)()
+                if not controller.is_playing and not paused_blocks:
+                    controller.play()
+
+            if block % blocks_per_hour == 0:
+                gc.collect()
+                now = time.perf_counter()
+                current, _ = tracemalloc.get_traced_memory()
+                # O PCM da faixa carregada e da seguinte varia com a duração delas: não é vazamento
+                current -= engine.buffered_bytes
+                samples.append({
+                    "hour": block // blocks_per_hour,
+                    "threads": threading.active_count(),
+                    "memory": current,
+                    "tick_rate": (ticks - sample_ticks) / (now - sample_wall),
+                    "events": events - sample_events,
+                    "wall": now - started,
+                })
+                sample_wall, sample_ticks, sample_events = now, ticks, events
+                s = samples[-1]
+                print(f"{s['hour']:4d} h  threads {s['threads']:3d}  memória {s['memory'] / 1024:8.0f} KiB  "
+                      f"posição {s['tick_rate']:5.1f}/s  eventos {s['events']:5d}/h  ({s['wall']:.0f}s reais)", flush=True)
+        return samples
+    finally:
+        # Também em erro ou Ctrl-C: as threads param antes de a pasta ser apagada
+        tracemalloc.stop()
+        controller.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Soak test do player com saída de áudio falsa")
+    parser.add_argument("--hours", type=float, default=48, help="horas de reprodução simuladas")
+    parser.add_argument("--block", type=int, default=4096, help="frames por bloco consumido")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    samples = soak(args.hours, args.block, args.seed)
+    failures = growth_failures(samples)
+    for failure in failures:
+        print(f"FALHA: {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK: threads, memória e atualizações estáveis")
@@ -0,0 +1,119 @@
+# Analisador de espectro e medidor de pico/RMS alimentados pelos blocos que estão tocando
+
+# Import required libraries
+import time
+
+import numpy as np
+
+import resampler
+
+# Cópia decimada: o espectro visual não precisa de agudos acima de ~5 kHz
+DECIMATION = 4
+FFT_SIZE = 1024
+BANDS = 16
+MIN_FREQ = 40
+# Faixa exibida em dB (abaixo disso a barra fica vazia)
+FLOOR_DB = -80.0
+
+
+class SpectrumAnalyzer:
+    """Peak/RMS meter and band spectrum computed from tapped PCM blocks"""
+
+    def __init__(self, rate=resampler.OUTPUT_RATE, bands=BANDS, fft_size=FFT_SIZE, decimation=DECIMATION):
+        self.rate = rate
+        self.decimation = decimation
+        self.fft_size = fft_size
+        self.window = np.hanning(fft_size).astype(np.float32)
+        self._ring = np.zeros(fft_size, dtype=np.float32)
+        self._write = 0
+
+        # Bandas logarítmicas até a Nyquist da cópia decimada
+        nyquist = rate / decimation / 2
+        freqs = np.fft.rfftfreq(fft_size, decimation / rate)
+        edges = np.geomspace(MIN_FREQ, nyquist, bands + 1)
+        self._band_bins = [np.flatnonzero((freqs >= lo) & (freqs < hi)) for lo, hi in zip(edges[:-1], edges[1:])]
+        # Bandas graves estreitas podem não ter bin: usa o mais próximo
+        self._band_bins = [b if len(b) else np.array([np.argmin(np.abs(freqs - lo))]) for b, lo in zip(self._band_bins, edges[:-1])]
+
+        self._peak = 0.0
+        self._sum_squares = 0.0
+        self._count = 0
+
+    def feed(self, block):
+        """Tap for the engine: accumulate levels and a decimated mono copy"""
+        self._peak = max(self._peak, float(np.abs(block).max(initial=0)))
+        self._sum_squares += float(np.square(block).sum())
+        self._count += block.size
+
+        usable = len(block) - len(block) % self.decimation
+        # Média de grupos de amostras: decima com um passa-baixa simples
+        mono = block[:usable].mean(axis=1).reshape(-1, self.decimation).mean(axis=1)
+        mono = mono[-self.fft_size:]
+        end = self._write + len(mono)
+        if end <= self.fft_size:
+            self._ring[self._write:end] = mono
+        else:
+            split = self.fft_size - self._write
+            self._ring[self._write:] = mono[:split]
+            self._ring[:end - self.fft_size] = mono[split:]
+        self._write = end % self.fft_size
+
+    def compute(self):
+        """Levels since the last call and the current spectrum (0..1 per band)"""
+        peak, sum_squares, count = self._peak, self._sum_squares, self._count
+        self._peak, self._sum_squares, self._count = 0.0, 0.0, 0
+        rms = np.sqrt(sum_squares / count) if count else 0.0
+
+        samples = np.roll(self._ring, -self._write) * self.window
+        power = np.abs(np.fft.rfft(samples)) ** 2 / (self.fft_size / 4) ** 2
+        bands = np.array([power[b].mean() for b in self._band_bins])
+        levels = (10 * np.log10(bands + 1e-12) - FLOOR_DB) / -FLOOR_DB
+        return {
+            "peak": round(to_db(peak), 1),
+            "rms": round(to_db(rms), 1),
+            # Poucas casas: deltas pequenos para a interface
+            "spectrum": [round(float(v), 2) for v in np.clip(levels, 0, 1)],
+        }
+
+
+def to_db(level):
+    return float(max(20 * np.log10(level + 1e-12), FLOOR_DB))
+
+
+def level_fraction(db):
+    """dB value to a 0..1 meter fill"""
+    return min(max((db - FLOOR_DB) / -FLOOR_DB, 0.0), 1.0)
+
+
+def benchmark(seconds=60, fps=10):
+    """CPU cost of rendering with the analyzer attached, hidden and shown"""
+    from engine import BLOCK_FRAMES, FakeSink, PlaybackEngine
+
+    rate = resampler.OUTPUT_RATE
+    rng = np.random.default_rng(0)
+    track = rng.uniform(-0.5, 0.5, (rate * seconds, 2)).astype(np.float32)
+
+    def run(analyzer):
+        engine = PlaybackEngine()
+        engine.load_pcm(track)
+        engine.play()
+        if analyzer:
+            engine.taps.append(analyzer.feed)
+        sink = FakeSink(engine)
+        blocks_per_frame = rate / fps / BLOCK_FRAMES
+        start = time.perf_counter()
+        for i in range(rate * seconds // BLOCK_FRAMES):
+            sink.pull()
+            # Um frame do visualizador a cada 1/fps segundos de áudio
+            if analyzer and i % blocks_per_frame < 1:
+                analyzer.compute()
+        return time.perf_counter() - start
+
+    hidden = run(None)
+    shown = run(SpectrumAnalyzer(rate))
+    print(f"Oculto: {hidden / seconds * 100:.3f}% do tempo real")
+    print(f"Visível: {shown / seconds * 100:.3f}% do tempo real (+{(shown - hidden) / seconds * 100:.3f}%)")
+
+
+if __name__ == "__main__":
+    benchmark()